@@ -1,8 +1,10 @@
 ## utils/indexing.py
 
+import bisect
+import itertools
 import numpy as np
 
-def create_indexing(gain_domain, anchors:dict, anchor_occupation:dict, anchor_dict:dict, outdir=None, offset=0, silent=False, split_mode='single',debug=False):
+def create_indexing(gain_domain, anchors:dict, anchor_occupation:dict, anchor_dict:dict, outdir=None, offset=0, silent=False, split_mode='single',debug=False, file_handle=None):
     ''' 
     Makes the indexing list, this is NOT automatically generated, since we do not need this for the base dataset
     Prints out the final list and writes it to file if outdir is specified
@@ -21,6 +23,9 @@ def create_indexing(gain_domain, anchors:dict, anchor_occupation:dict, anchor_di
         opt in to run wihtout so much info.
     outdir : str, optional
         Output directory where the output TXT is going to be written as {gain_domain.name}.txt
+    file_handle : file object, optional
+        An already opened text file the indexing is appended to instead of a file in outdir.
+        Useful when writing the indexing of many GAIN domains into one file.
 
     Returns
     ---------
@@ -42,13 +47,17 @@ def create_indexing(gain_domain, anchors:dict, anchor_occupation:dict, anchor_di
         cast_values = (sse, ref_res, sse_name)
         return name_list, cast_values
 
-    def indexing2longfile(gain_domain, nom_list, outfile, offset):
-        ''' Creates a file where the indexing will be denoted line-wise per residue'''
+    def indexing2longfile(gain_domain, nom_list, outfile, offset, file_handle=None):
+        ''' Creates a file where the indexing will be denoted line-wise per residue, or writes to file_handle if provided'''
+        lines = [gain_domain.name+"\nSequence length: "+str(len(gain_domain.sequence))+"\n\n"]
+        print("[DEBUG] GainDomain.create_indexing.indexing2longfile\n", nom_list, "\n", outfile)
+        lines.extend(f"{gain_domain.sequence[j]}  {str(j+gain_domain.start+offset).rjust(4)}  {name.rjust(7)}\n"
+                     for j, name in enumerate(nom_list[gain_domain.start:]))
+        if file_handle is not None:
+            file_handle.writelines(lines)
+            return
         with open(outfile, "w") as file:
-            file.write(gain_domain.name+"\nSequence length: "+str(len(gain_domain.sequence))+"\n\n")
-            print("[DEBUG] GainDomain.create_indexing.indexing2longfile\n", nom_list, "\n", outfile)
-            for j, name in enumerate(nom_list[gain_domain.start:]):
-                file.write(f"{gain_domain.sequence[j]}  {str(j+gain_domain.start+offset).rjust(4)}  {name.rjust(7)}\n")
+            file.writelines(lines)
 
     def disambiguate_anchors(gain_domain, stored_anchor_weight, stored_res, new_anchor_weight, new_res, sse, coiled_residues, outlier_residues, mode='single'):
         #Outlier and Coiled residues are indicated as relative indices (same as sse, stored_res, new_res etc.)
@@ -62,16 +71,18 @@ def create_indexing(gain_domain, anchors:dict, anchor_occupation:dict, anchor_di
             if not include:
                 terminal = -1
 
-            n_breaks = [r for r in break_residues if r < center_res and r >= sse[0]]
-            c_breaks = [r for r in break_residues if r > center_res and r <= sse[1]]
+            # The closest break residue on either side of center_res within the SSE, found by bisecting the sorted break residues
+            sorted_breaks = sorted(break_residues)
+            n_idx = bisect.bisect_left(sorted_breaks, center_res) - 1
+            c_idx = bisect.bisect_right(sorted_breaks, center_res)
 
-            if n_breaks != []:
-                N_boundary = max(n_breaks) - terminal
+            if n_idx >= 0 and sorted_breaks[n_idx] >= sse[0]:
+                N_boundary = sorted_breaks[n_idx] - terminal
             else:
                 N_boundary = sse[0]
 
-            if c_breaks != []:
-                C_boundary = min(c_breaks) + terminal
+            if c_idx < len(sorted_breaks) and sorted_breaks[c_idx] <= sse[1]:
+                C_boundary = sorted_breaks[c_idx] + terminal
             else:
                 C_boundary = sse[1]
 
@@ -94,18 +105,11 @@ def create_indexing(gain_domain, anchors:dict, anchor_occupation:dict, anchor_di
             return [(sse, name_list, cast_values)], False
 
         # b) check first if there is a Coiled residue in between the two conflicting anchors
-        for coiled_res in coiled_residues:
-            if stored_res < coiled_res and coiled_res < new_res:
-                hasCoiled = True
-            if new_res < coiled_res and coiled_res < stored_res:
-                hasCoiled = True
+        lower_anchor, upper_anchor = min(stored_res, new_res), max(stored_res, new_res)
+        hasCoiled = any(lower_anchor < coiled_res < upper_anchor for coiled_res in coiled_residues)
 
         # c) check if there is an outlier residue in between the two conflicting anchors
-        for outlier_res in outlier_residues:
-            if stored_res < outlier_res and outlier_res < new_res:
-                hasOutlier = True
-            if new_res < outlier_res and outlier_res < stored_res:
-                hasOutlier = True
+        hasOutlier = any(lower_anchor < outlier_res < upper_anchor for outlier_res in outlier_residues)
 
         # If there are no breaks, take the anchor with higher occupation, discard the other.
         if hasCoiled == False and hasOutlier == False:
@@ -147,24 +151,18 @@ def create_indexing(gain_domain, anchors:dict, anchor_occupation:dict, anchor_di
             else: # This case: lower_seg is N-terminal
                 upper_seg = [lower_c-terminal, sse[1]]
 
-            # Go in left and right direction, check where there is the first break
-            breaker = None
-            offset = 1
-            while offset < 20:
-                if lower_res + offset in breaker_residues:
-                    offset_idx = breaker_residues.index(lower_res + offset)
-                    breaker = lower_res + offset
-                    break
-                if lower_res - offset in breaker_residues:
-                    offset_idx = breaker_residues.index(lower_res - offset)
-                    breaker = lower_res - offset
-                    break
-
-                offset += 1
-
-            if breaker is None:
+            # Go in left and right direction, check where there is the first break (up to 19 residues away, C-terminal side first on ties)
+            # The closest breaker on either side is found by bisecting the sorted breaker residues instead of probing every offset.
+            sorted_breakers = sorted(breaker_residues)
+            c_idx = bisect.bisect_right(sorted_breakers, lower_res)
+            n_idx = bisect.bisect_left(sorted_breakers, lower_res) - 1
+            c_offset = sorted_breakers[c_idx] - lower_res if c_idx < len(sorted_breakers) else 20
+            n_offset = lower_res - sorted_breakers[n_idx] if n_idx >= 0 else 20
+            if min(c_offset, n_offset) >= 20:
                 print("[ERROR] BREAKER residue not found.")
                 return None, None
+            breaker = lower_res + c_offset if c_offset <= n_offset else lower_res - n_offset
+            offset_idx = breaker_residues.index(breaker)
 
             # Divide SSE via BREAKER into two segments, create two separate name_list instances for them
             # If the breaker was a coil, set terminal to 1 to exclude this residue; otherwise, include it.
@@ -202,7 +200,8 @@ def create_indexing(gain_domain, anchors:dict, anchor_occupation:dict, anchor_di
 
     def cast(nom_list, indexing_dir, indexing_centers, sse_x, name_list, cast_values):
         #print(f"DEBUG CAST",sse_x, name_list, cast_values)
-        nom_list[sse_x[0]+gain_domain.start : sse_x[1]+1+gain_domain.start] = name_list
+        if nom_list is not None:
+            nom_list[sse_x[0]+gain_domain.start : sse_x[1]+1+gain_domain.start] = name_list
         indexing_dir[cast_values[2]] = cast_values[0] # all to sse 
         indexing_centers[cast_values[2]+".50"] = cast_values[1] # sse_res where the anchor is located
         return nom_list, indexing_dir, indexing_centers
@@ -212,24 +211,43 @@ def create_indexing(gain_domain, anchors:dict, anchor_occupation:dict, anchor_di
     indexing_centers = {}
     named_residue_dir = {}
     unindexed = []
-    # One-indexed Indexing list for each residue, mapping for the actual residue index
-    nom_list = np.full([gain_domain.end+1], fill_value='      ', dtype='<U7')
+    # One-indexed Indexing list for each residue, mapping for the actual residue index.
+    # It is only needed for the indexing file, so the per-residue strings are not written without outdir or file_handle.
+    if outdir is not None or file_handle is not None:
+        nom_list = np.full([gain_domain.end+1], fill_value='      ', dtype='<U7')
+    else:
+        nom_list = None
+    # Position of each anchor column in anchors (first occurrence), replaces a np.where() scan per anchor hit
+    anchor_pos = {}
+    for anchor_idx, anchor_col in enumerate(np.asarray(anchors).tolist()):
+        anchor_pos.setdefault(anchor_col, anchor_idx)
+    # Anchor columns sorted once for the interval search, anchor_order maps back to the positions in anchors
+    anchor_arr = np.asarray(anchors)
+    anchor_order = np.argsort(anchor_arr, kind='stable')
+    sorted_anchors = anchor_arr[anchor_order]
+
+    # Local references to the GainDomain attributes used per residue in the loop below
+    alignment_indices = gain_domain.alignment_indices
+    gd_start, gd_end = gain_domain.start, gain_domain.end
+    sse_sequence = gain_domain.sse_sequence
+    sse_letters = None
 
     for i,typus in enumerate([gain_domain.sda_helices, gain_domain.sdb_sheets]): # Both types will be indexed separately
         # Go through each individual SSE in the GAIN SSE dictionary
         for idx, sse in enumerate(typus):
             # Get first and last residue of this SSE
+            sse_first, sse_last = sse[0], sse[1]
             #try:
-            first_col = gain_domain.alignment_indices[sse[0]]
+            first_col = alignment_indices[sse_first]
             #except: continue
             # Error correction. Sometimes the detected last Strand exceeds the GAIN boundary.
-            if debug: print(f"DEBUG {sse[1] = }; {gain_domain.end-gain_domain.start = }, {len(gain_domain.alignment_indices) = }")
-            if sse[1] > gain_domain.end-gain_domain.start-1:
-                last_col = gain_domain.alignment_indices[-1]
-                sse_end = sse[1]-1
+            if debug: print(f"DEBUG {sse[1] = }; {gd_end-gd_start = }, {len(alignment_indices) = }")
+            if sse_last > gd_end-gd_start-1:
+                last_col = alignment_indices[-1]
+                sse_end = sse_last-1
             else:
-                last_col = gain_domain.alignment_indices[sse[1]]
-                sse_end = sse[1]
+                last_col = alignment_indices[sse_last]
+                sse_end = sse_last
 
             exact_match = False                             # This is set to True, otherwise continue to Interval search
             fuzzy_match = False                             # Flag for successful Interval search detection
@@ -237,134 +255,145 @@ def create_indexing(gain_domain, anchors:dict, anchor_occupation:dict, anchor_di
             if debug:print(f"[DEBUG] GainDomain.create_indexing : \n{typus} No. {idx+1}: {sse}")
             if debug:print(f"[DEBUG] GainDomain.create_indexing : \n{first_col = }, {last_col = }")
 
-            for sse_res in range(sse[0],sse_end+1):
-                # Find the corresponding alignment index for that residue:
-                if sse_res < len(gain_domain.alignment_indices):
-                    sse_idx = gain_domain.alignment_indices[sse_res]
-                else:
+            # Find the corresponding alignment index for each residue; only residues on an anchor column are visited.
+            sse_cols = np.asarray(alignment_indices[sse_first:sse_end+1])
+            for sse_res in (sse_first + np.flatnonzero(np.isin(sse_cols, anchors))).tolist():
+                sse_idx = alignment_indices[sse_res]
+
+                if exact_match == False:
+                    if debug: print(f"PEAK FOUND: @ {sse_res = }, {sse_idx = }, {anchor_dict[sse_idx]}")
+                    #sse_name = anchor_dict[sse_idx]
+                    anchor_idx = anchor_pos[sse_idx]
+                    if debug: print(f"{np.where(anchors == sse_idx)[0] = }, {sse_idx = }, {anchor_idx = }")
+                    stored_anchor_weight = anchor_occupation[anchor_idx]
+                    #stored_anchor = anchors[anchor_idx]
+                    stored_res = sse_res
+                    name_list, cast_values = create_name_list(sse, sse_res, anchor_dict[sse_idx])
+                    # name_list has the assignment for the SSE, cast_values contains the passed values for dict casting
+                    exact_match = True
                     continue
-
-                if sse_idx in anchors:
-
-                    if exact_match == False:
-                        if debug: print(f"PEAK FOUND: @ {sse_res = }, {sse_idx = }, {anchor_dict[sse_idx]}")
-                        #sse_name = anchor_dict[sse_idx]
-                        anchor_idx = np.where(anchors == sse_idx)[0][0]
-                        if debug: print(f"{np.where(anchors == sse_idx)[0] = }, {sse_idx = }, {anchor_idx = }")
-                        stored_anchor_weight = anchor_occupation[anchor_idx]
-                        #stored_anchor = anchors[anchor_idx]
-                        stored_res = sse_res
-                        name_list, cast_values = create_name_list(sse, sse_res, anchor_dict[sse_idx])
-                        # name_list has the assignment for the SSE, cast_values contains the passed values for dict casting
-                        exact_match = True
-                        continue
-                    ''' HERE is an ANCHOR AMBIGUITY CASE
-                            There might occur the case where two anchors are within one SSE, 
-                            check for present break residues in between the two anchors, 
-                            > If there are some, eliminate that residue and break the SSE it into two.
-                                >   If there are multiple break residues, use the one closest to the lower occupancy anchor
-                            > If there is no break residue the anchor with highest occupation wins. '''
-                    ambiguous = True
-                    if not silent:
-                        print(f"[NOTE] GainDomain.create_indexing : ANCHOR AMBIGUITY in this SSE:")
-                        print(f"\n\t {sse_idx = },")
-                        print(f"\n\t {anchor_dict[sse_idx] = },")
-                    # if the new anchor is scored better than the first, replace!
-
-                    # Check for residues that have assigned "C" or "h" in GainDomain.sse_sequence
+                ''' HERE is an ANCHOR AMBIGUITY CASE
+                        There might occur the case where two anchors are within one SSE, 
+                        check for present break residues in between the two anchors, 
+                        > If there are some, eliminate that residue and break the SSE it into two.
+                            >   If there are multiple break residues, use the one closest to the lower occupancy anchor
+                        > If there is no break residue the anchor with highest occupation wins. '''
+                ambiguous = True
+                if not silent:
+                    print(f"[NOTE] GainDomain.create_indexing : ANCHOR AMBIGUITY in this SSE:")
+                    print(f"\n\t {sse_idx = },")
+                    print(f"\n\t {anchor_dict[sse_idx] = },")
+                # if the new anchor is scored better than the first, replace!
+
+                # Check for residues that have assigned "C" or "h" in GainDomain.sse_sequence
+                if sse_letters is None:
+                    # The SSE letters as an array, built once on the first ambiguity. STRIDE residue numbers are contiguous keys.
+                    sse_keys = np.fromiter(sse_sequence.keys(), dtype=int, count=len(sse_sequence))
+                    sse_letters = np.array(list(sse_sequence.values()))
+                    first_key, max_key = sse_keys[0], sse_keys.max()
+                    contiguous = np.array_equal(sse_keys, np.arange(first_key, first_key+len(sse_keys)))
+                if contiguous and sse_first+gd_start >= first_key:
+                    lo, hi = sse_first+gd_start, min(sse_last+gd_start, max_key)
+                    if debug and sse_last+gd_start > max_key:
+                        print("[DEBUG]: GainDomain.create_indexing. {i = } exceeded {max_key = }")
+                    seg = sse_letters[lo-first_key:hi-first_key+1]
+                    coiled_residues = (np.flatnonzero(seg == "C") + lo-gd_start).tolist()
+                    outlier_residues = (np.flatnonzero(seg == "h") + lo-gd_start).tolist()
+                else:
                     coiled_residues = []
                     outlier_residues = []
-                    max_key = max(gain_domain.sse_sequence.keys())
-                    for i in range(sse[0]+gain_domain.start, sse[1]+gain_domain.start+1):
+                    for i in range(sse_first+gd_start, sse_last+gd_start+1):
                         if i > max_key:
                             if debug:
                                 print("[DEBUG]: GainDomain.create_indexing. {i = } exceeded {max_key = }")
                             break
-                        if gain_domain.sse_sequence[i] ==  "C":
-                            coiled_residues.append(i-gain_domain.start)
-                        if gain_domain.sse_sequence[i] == 'h':
-                            outlier_residues.append(i-gain_domain.start)
-                    if debug:
-                        print(f"[DEBUG] GainDomain.create_indexing :\n\t{coiled_residues  = }\n\t{outlier_residues = }")
-                    disambiguated_lists, isSplit = disambiguate_anchors(gain_domain,
-                                                                        stored_anchor_weight=stored_anchor_weight,
-                                                                        stored_res=stored_res,
-                                                                        new_anchor_weight=anchor_occupation[np.where(anchors == sse_idx)[0][0]],
-                                                                        new_res=sse_res,
-                                                                        sse=sse,
-                                                                        coiled_residues=coiled_residues,
-                                                                        outlier_residues=outlier_residues,
-                                                                        mode=split_mode)
-                    if not silent: print(disambiguated_lists)
-                    sse_adj, name_list, cast_values = disambiguated_lists[0]
-                    if isSplit:
-                        sse_adj_2, name_2, cast_2 = disambiguated_lists[1]
-                        if not silent: print(f"[DEBUG] GainDomain.create_indexing : Found a split list:\n"
-                            f"{sse_adj_2  = },\t{name_2 = },\t{cast_2 =  }")
-                        nom_list, indexing_dir, indexing_centers = cast(nom_list, indexing_dir, indexing_centers, sse_adj_2, name_2, cast_2)
-                        # Also write split stuff to the new dictionary
-                        for entryidx, entry in enumerate(name_2):
-                            named_residue_dir[entry] = entryidx+sse_adj[0]+gain_domain.start
-                    # if anchor_occupation[np.where(anchors == sse_idx)[0]] > stored_anchor_weight:
-                    #    name_list, cast_values = create_name_list(sse, sse_res, anchor_dict[sse_idx])
+                        if sse_sequence[i] ==  "C":
+                            coiled_residues.append(i-gd_start)
+                        if sse_sequence[i] == 'h':
+                            outlier_residues.append(i-gd_start)
+                if debug:
+                    print(f"[DEBUG] GainDomain.create_indexing :\n\t{coiled_residues  = }\n\t{outlier_residues = }")
+                disambiguated_lists, isSplit = disambiguate_anchors(gain_domain,
+                                                                    stored_anchor_weight=stored_anchor_weight,
+                                                                    stored_res=stored_res,
+                                                                    new_anchor_weight=anchor_occupation[anchor_pos[sse_idx]],
+                                                                    new_res=sse_res,
+                                                                    sse=sse,
+                                                                    coiled_residues=coiled_residues,
+                                                                    outlier_residues=outlier_residues,
+                                                                    mode=split_mode)
+                if not silent: print(disambiguated_lists)
+                sse_adj, name_list, cast_values = disambiguated_lists[0]
+                if isSplit:
+                    sse_adj_2, name_2, cast_2 = disambiguated_lists[1]
+                    if not silent: print(f"[DEBUG] GainDomain.create_indexing : Found a split list:\n"
+                        f"{sse_adj_2  = },\t{name_2 = },\t{cast_2 =  }")
+                    nom_list, indexing_dir, indexing_centers = cast(nom_list, indexing_dir, indexing_centers, sse_adj_2, name_2, cast_2)
+                    # Also write split stuff to the new dictionary
+                    named_residue_dir.update(zip(name_2, itertools.count(sse_adj[0]+gd_start)))
+                # if anchor_occupation[np.where(anchors == sse_idx)[0]] > stored_anchor_weight:
+                #    name_list, cast_values = create_name_list(sse, sse_res, anchor_dict[sse_idx])
             # if no exact match is found, continue to Interval search and assignment.
             if exact_match == False:
                 # expand anchor detection to +1 and -1 of SSE interval
-                ex_first_col = gain_domain.alignment_indices[sse[0]-1]
-                try:
-                    ex_last_col = gain_domain.alignment_indices[sse[1]+1]
-                except:
-                    ex_last_col = last_col
+                ex_first_col = alignment_indices[sse_first-1]
+                # The SSE may end at the last mapped residue, then there is no column after it
+                ex_last_col = alignment_indices[sse_last+1] if sse_last+1 < len(alignment_indices) else last_col
                 # Construct an Interval of alignment columns corresp. to the SSE residues
                 if debug:print(f"[DEBUG] GainDomain.create_indexing : \nNo exact match found: extindeing search.\n{typus} No. {idx+1}: {sse}")
-                for peak in anchors: # Look if any peak is contained here
+                # Look if any peak is contained here: bisect the sorted anchor columns, then visit the hits in the order of anchors
+                lo = np.searchsorted(sorted_anchors, ex_first_col, side='left')
+                hi = np.searchsorted(sorted_anchors, ex_last_col, side='right')
+                for peak in anchor_arr[np.sort(anchor_order[lo:hi])]:
 
-                    if ex_first_col <= peak and ex_last_col >= peak:
-                        fuzzy_match = True
-                        if not silent: print(f"[DEBUG] GainDomain.create_indexing : Interval search found anchor @ Column {peak}")
-                        # Find the closest residue to the anchor column index. N-terminal wins if two residues tie.
-                        peak_dists = [abs(gain_domain.alignment_indices[res]-peak) \
-                                                for res in range(sse[0], sse_end+1)]
+                    fuzzy_match = True
+                    if not silent: print(f"[DEBUG] GainDomain.create_indexing : Interval search found anchor @ Column {peak}")
+                    # Find the closest residue to the anchor column index. N-terminal wins if two residues tie.
+                    peak_dists = np.abs(np.asarray(alignment_indices[sse_first:sse_end+1]) - peak)
+                    if len(peak_dists) < sse_end+1-sse_first:
+                        raise IndexError(f"SSE {sse} exceeds the alignment indices of {gain_domain.name}")
 
-                        ref_idx = peak_dists.index(min(peak_dists))
-                        ref_res = range(sse[0], sse_end+1)[ref_idx]
+                    ref_idx = int(peak_dists.argmin()) # argmin returns the first minimum
+                    ref_res = int(sse_first) + ref_idx
 
-                        if not silent: print(f"NOTE: GainDomain.create_indexing : Interval search found SSE:"
-                                                f"{peak = }, {peak_dists = }, {ref_res = }. \n"
-                                                f"NOTE: GainDomain.create_indexing : This will be named {anchor_dict[peak]}")
+                    if not silent: print(f"NOTE: GainDomain.create_indexing : Interval search found SSE:"
+                                            f"{peak = }, {peak_dists = }, {ref_res = }. \n"
+                                            f"NOTE: GainDomain.create_indexing : This will be named {anchor_dict[peak]}")
 
-                        name_list, cast_values = create_name_list(sse, ref_res, anchor_dict[peak])
+                    name_list, cast_values = create_name_list(sse, ref_res, anchor_dict[peak])
 
             # Finally, if matched, write the assigned nomeclature segment to the array
 
             if ambiguous == False and exact_match == True or fuzzy_match == True:
                 nom_list, indexing_dir, indexing_centers = cast(nom_list, indexing_dir, indexing_centers, sse, name_list, cast_values)
                 # Also cast to general indexing dictionary
-                for namidx, entry in enumerate(name_list):
-                    named_residue_dir[entry] = namidx+sse[0]+gain_domain.start
+                named_residue_dir.update(zip(name_list, itertools.count(sse_first+gd_start)))
             elif ambiguous == True:
                 nom_list, indexing_dir, indexing_centers = cast(nom_list, indexing_dir, indexing_centers, sse_adj, name_list, cast_values)
                 # Also cast to general indexing dictionary
-                for namidx, entry in enumerate(name_list):
-                    named_residue_dir[entry] = namidx+sse_adj[0]+gain_domain.start
+                named_residue_dir.update(zip(name_list, itertools.count(sse_adj[0]+gd_start)))
             else: # If there is an unadressed SSE with length 3 or more, then add this to unindexed.
-                if sse[1]-sse[0] > 3:
-                    if debug: print(f"[DEBUG] GainDomain.create_indexing : No anchor found! \n {gain_domain.alignment_indices[sse[0]] = } \ns{gain_domain.alignment_indices[sse_end] = }")
-                    unindexed.append(gain_domain.alignment_indices[sse[0]])
+                if sse_last-sse_first > 3:
+                    if debug: print(f"[DEBUG] GainDomain.create_indexing : No anchor found! \n {alignment_indices[sse[0]] = } \ns{alignment_indices[sse_end] = }")
+                    unindexed.append(alignment_indices[sse_first])
     # Patch the GPS into the nom_list
     labels = ["GPS-2","GPS-1","GPS+1"]
-    for i, residue in enumerate(gain_domain.GPS.residue_numbers[:3]):
-        #print(residue)
-        nom_list[residue] = labels[i]
+    gps_residues = gain_domain.GPS.residue_numbers[:3]
+    if len(gps_residues) > 0:
         indexing_dir["GPS"] = gain_domain.GPS.residue_numbers
-        # Also cast this to the general indexing dictionary
-        named_residue_dir[labels[i]] = gain_domain.GPS.residue_numbers[i]
+    if nom_list is not None:
+        for label, residue in zip(labels, gps_residues):
+            nom_list[residue] = label
+    # Also cast this to the general indexing dictionary
+    named_residue_dir.update(zip(labels, gps_residues))
     # FUTURE CHANGE : GPS assignment maybe needs to be more fuzzy -> play with the interval of the SSE 
     #       and not the explicit anchor. When anchor col is missing, the whole SSE wont be adressed
     # print([DEBUG] : GainDomain.create_indexing : ", nom_list)
 
     # Create a indexing File if specified
-    if outdir is not None:
+    if file_handle is not None:
+        indexing2longfile(gain_domain, nom_list, getattr(file_handle, "name", None), offset=offset, file_handle=file_handle)
+    elif outdir is not None:
         indexing2longfile(gain_domain, nom_list, f"{outdir}/{gain_domain.name}.txt", offset=offset)
 
     return indexing_dir, indexing_centers, named_residue_dir, unindexed
\ No newline at end of file
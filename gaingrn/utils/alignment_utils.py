@@ -5,8 +5,37 @@ from gaingrn.utils.structure_utils import find_the_start
 import gaingrn.utils.alignment_utils
 import gaingrn.utils.io
 
+from functools import lru_cache
+import multiprocessing as mp
+
 import numpy as np
 
+@lru_cache(maxsize=4)
+def _load_fasta_index(alignment_file, mtime_ns, size, inode):
+    # Header offsets of an alignment, built once per file version (see gaingrn.utils.io._file_version()). get_indices() reads only the one sequence it needs from them.
+    return gaingrn.utils.io.FastaIndex(alignment_file)
+
+def _map_ungapped(sequence, align_seq, aln_start_res, truncation_map=None):
+    # Vectorized fast path of get_indices(): If the (non-truncated) residues match the non-gap alignment columns from aln_start_res on
+    # one by one, these columns are exactly what the residue-wise search would find. Returns None if not, then the search has to run.
+    seq_str = "".join(sequence)
+    if len(seq_str) != len(sequence) or not seq_str.isascii() or not align_seq.isascii():
+        return None
+    aln_bytes = np.frombuffer(align_seq.encode(), dtype=np.uint8)
+    non_gap_cols = np.flatnonzero(aln_bytes[aln_start_res:] != ord("-")) + aln_start_res
+
+    kept = np.ones(len(seq_str), dtype=bool) if truncation_map is None else ~np.asarray(truncation_map, dtype=bool)
+    seq_bytes = np.frombuffer(seq_str.encode(), dtype=np.uint8)[kept]
+    if seq_bytes.shape[0] > non_gap_cols.shape[0]:
+        return None
+    cols = non_gap_cols[:seq_bytes.shape[0]]
+    if not np.array_equal(aln_bytes[cols], seq_bytes):
+        return None
+
+    mapper = np.full([len(seq_str)], -1, dtype=int)
+    mapper[kept] = cols
+    return mapper
+
 def get_indices(name, sequence, alignment_file, aln_cutoff, alignment_dict=None, truncation_map=None, aln_start_res=None, debug=False):
     '''
     Find a sequence in the alignment file, output a number of corresponding alignment indices for each residue in sequence
@@ -33,32 +62,38 @@ def get_indices(name, sequence, alignment_file, aln_cutoff, alignment_dict=None,
     #print(f"[DEBUG] gaingrn.utils.alignment_utils.get_indices : {sequence.shape = }")
     mapper = np.zeros([sequence.shape[0]],dtype=int) # Initialize the mapper for output
     #print(f"[DEBUG] gaingrn.utils.alignment_utils.get_indices : {mapper.shape = }")
-    if not alignment_dict:
-        alignment_dict = gaingrn.utils.io.read_alignment(alignment_file, aln_cutoff)
-
     # PATCH: If the name ends on ".fa", eliminate that.
-    try: nam = name.split(".fa")[0]
-    except: nam = name
+    nam = name.split(".fa")[0] if isinstance(name, str) else name
 
     #print(f"[DEBUG] gaingrn.utils.alignment_utils.get_indices : \n\t{nam = }, is it in the dict? {nam in alignment_dict.keys()}")
-    try:
-        align_seq = alignment_dict[nam]#[::-1] # make the reference alignment reverse to compare rev 2 rev
-    except KeyError:
+    if alignment_dict:
+        align_seq = alignment_dict.get(nam)#[::-1] # make the reference alignment reverse to compare rev 2 rev
+    else:
+        # Without alignment_dict, only this sequence is read from the file instead of the whole alignment
+        align_seq = _load_fasta_index(*gaingrn.utils.io._file_version(alignment_file)).fetch(nam, aln_cutoff)
+    if align_seq is None:
         print("[WARNING]: Sequence not found. If this is unintended, check the Alignment file!\n", nam)
         return None
 
     if aln_start_res is None:
         try:
-            aln_start_res = find_the_start(alignment_dict[nam], sequence)
+            aln_start_res = find_the_start(align_seq, sequence)
             # Finds the first index matching the sequence end and outputs the index
             #print(f"Found the start! {aln_start_res = }")#\n {align_seq = }")
         except:
             print("[ERROR]: Did not find the Sequence! - No start.")
             return None
 
+    mapped = _map_ungapped(sequence, align_seq, aln_start_res, truncation_map)
+    if mapped is not None:
+        if debug and truncation_map is not None:
+            for i in np.flatnonzero(truncation_map):
+                print(f"[NOTE]: Skipping truncated residue @ {sequence[i]}{i+1}")
+        return mapped
+
     align_index = aln_start_res
     #print("".join(sequence), len(sequence))
-    for i,residue in enumerate(sequence):   # For each residue, enter the While loop
+    for i,residue in enumerate(sequence):   # For each residue, search its alignment column
 
         # If the current residue is truncated, skip to the next one.
         if truncation_map is not None and truncation_map[i]:
@@ -67,20 +102,68 @@ def get_indices(name, sequence, alignment_file, aln_cutoff, alignment_dict=None,
                 print(f"[NOTE]: Skipping truncated residue @ {residue}{i+1}")
             continue
 
-        while align_index < len(align_seq):                         # True ; To find the residue
-            if residue == align_seq[align_index]:
-                mapper[i] = align_index     # If it is found, note the index
-                align_index += 1            # advance the index to avoid double counted identical resiudes (i.e. "EEE")
-                break
-            elif align_seq[align_index] != "-":
-                if debug:
-                    print("[DEBUG] WARNING! OUT OF PLACE RESIDUE FOUND:", align_seq[align_index], "@", align_index, "while searching for", residue, i)
-            align_index += 1
+        # Jump to the next column holding the residue (str.find instead of stepping through every column)
+        found_index = align_seq.find(residue, align_index) if len(residue) == 1 else -1
+        if debug:
+            for skipped in range(align_index, found_index if found_index != -1 else len(align_seq)):
+                if align_seq[skipped] != "-":
+                    print("[DEBUG] WARNING! OUT OF PLACE RESIDUE FOUND:", align_seq[skipped], "@", skipped, "while searching for", residue, i)
+        if found_index == -1:
+            align_index = max(align_index, len(align_seq))
+            continue
+        mapper[i] = found_index         # If it is found, note the index
+        align_index = found_index + 1   # advance the index to avoid double counted identical resiudes (i.e. "EEE")
     # return the matching list of alignment indices for each Sequence residue
     #print(f"[DEBUG] gaingrn.utils.alignment_utils.get_indices : mapper constructed successfully.")
     #print(f"{mapper}")
     return mapper
 
+# Alignment of the get_indices_batch() worker processes, set once per worker by _init_indices_worker()
+_worker_alignment = None
+
+def _init_indices_worker(alignment_file, aln_cutoff, alignment_dict):
+    global _worker_alignment
+    _worker_alignment = alignment_dict if alignment_dict else gaingrn.utils.io.read_alignment(alignment_file, aln_cutoff)
+
+def _get_indices_worker(name, sequence, alignment_file, aln_cutoff, truncation_map, debug):
+    return get_indices(name, sequence, alignment_file, aln_cutoff, alignment_dict=_worker_alignment, truncation_map=truncation_map, debug=debug)
+
+def get_indices_batch(names, sequences, alignment_file, aln_cutoff, alignment_dict=None, truncation_maps=None, n_threads=10, chunksize=16, debug=False):
+    '''
+    Parallel variant of get_indices() for mapping many sequences onto the same alignment.
+    Each worker process holds the alignment once (taken from alignment_dict or read from alignment_file) and maps its share of the sequences.
+
+    Parameters:
+        names : list, required
+            The sequence names, each must correspond to a name in the alignment file
+        sequences : list, required
+            The one-letter coded amino acid sequences (numpy arrays), in the order of names
+        alignment_file : str, required
+            The alignment file containing all the information and names
+        aln_cutoff : int, required
+            The integer value of the last alignment residue column to be parsed
+        alignment_dict : dict, optional
+            If specified, skips loading the alignment file and directly looks up the sequences in the dictionary.
+        truncation_maps : list, optional
+            One truncation map (or None) per sequence, as in get_indices()
+        n_threads : int, optional
+            Number of worker processes mapping the sequences. default = 10
+        chunksize : int, optional
+            Number of sequences handed to a worker at once, amortizes the inter-process communication. default = 16
+        debug : bool, optional
+            Specifies additional output for debugging
+    Returns:
+        mappers : list
+            The get_indices() result for each sequence, None where the sequence could not be mapped
+    '''
+    if truncation_maps is None:
+        truncation_maps = [None]*len(names)
+    args = [(name, sequence, alignment_file, aln_cutoff, truncation_map, debug)
+            for name, sequence, truncation_map in zip(names, sequences, truncation_maps)]
+
+    with mp.Pool(n_threads, initializer=_init_indices_worker, initargs=(alignment_file, aln_cutoff, alignment_dict)) as index_pool:
+        return index_pool.starmap(_get_indices_worker, args, chunksize=chunksize)
+
 def get_quality(alignment_indices, quality_arr):
     '''
     Parses through the quality array and extracts the matching columns of alignment indices to assign each residue a quality value.
@@ -96,10 +179,8 @@ def get_quality(alignment_indices, quality_arr):
         index_qualities : list
             A list of values matching each index in alignment_indices
     '''
-    index_qualities = np.zeros([len(alignment_indices)])
-
-    for i,position in enumerate(alignment_indices):
-        index_qualities[i] = quality_arr[position]
+    # One gather over all positions. Truncated residues (-1) read the last column, as with the element-wise lookup.
+    index_qualities = np.asarray(quality_arr, dtype=float)[np.asarray(alignment_indices, dtype=np.intp)]
 
     return index_qualities
 
@@ -120,13 +201,18 @@ def make_anchor_dict(fixed_anchors, sd_boundary):
         anchor_dict : dict
             the enumerated adressing of each anchor residue with greek letters
     '''
+    # Single pass, helix entries are still placed before the sheet entries
     anchor_dict = {}
-    helices = [a for a in fixed_anchors if a < sd_boundary]
-    sheets = [a for a in fixed_anchors if a > sd_boundary]
-    for idx, h in enumerate(helices):
-        anchor_dict[h] = "H"+str(idx+1)
-    for idx, s in enumerate(sheets):
-        anchor_dict[s] = "S"+str(idx+1)
+    sheet_dict = {}
+    n_helices, n_sheets = 0, 0
+    for a in fixed_anchors:
+        if a < sd_boundary:
+            n_helices += 1
+            anchor_dict[a] = "H"+str(n_helices)
+        elif a > sd_boundary:
+            n_sheets += 1
+            sheet_dict[a] = "S"+str(n_sheets)
+    anchor_dict.update(sheet_dict)
     return anchor_dict
 
 def find_offsets(fasta_file, accessions, sequences):
@@ -1,7 +1,9 @@
 ## scritps/assign.py
 # contains the main function for assigning the GAIN-GRN indexing on single GAIN domains or whole sets of GAIN domains
 
+import bisect
 import glob
+import itertools
 import json
 import os
 from types import SimpleNamespace
@@ -62,16 +64,18 @@ def create_subdomain_indexing(gain_obj, subdomain, actual_centers, threshold=3,
             if not include:
                 terminal = -1
 
-            n_breaks = [r for r in break_residues if r < center_res and r >= sse[0]]
-            c_breaks = [r for r in break_residues if r > center_res and r <= sse[1]]
+            # The closest break residue on either side of center_res within the SSE, found by bisecting the sorted break residues
+            sorted_breaks = sorted(break_residues)
+            n_idx = bisect.bisect_left(sorted_breaks, center_res) - 1
+            c_idx = bisect.bisect_right(sorted_breaks, center_res)
 
-            if n_breaks != []:
-                N_boundary = max(n_breaks) - terminal
+            if n_idx >= 0 and sorted_breaks[n_idx] >= sse[0]:
+                N_boundary = sorted_breaks[n_idx] - terminal
             else:
                 N_boundary = sse[0]
 
-            if c_breaks != []:
-                C_boundary = min(c_breaks) + terminal
+            if c_idx < len(sorted_breaks) and sorted_breaks[c_idx] <= sse[1]:
+                C_boundary = sorted_breaks[c_idx] + terminal
             else:
                 C_boundary = sse[1]
 
@@ -147,9 +151,13 @@ def create_subdomain_indexing(gain_obj, subdomain, actual_centers, threshold=3,
     elif subdomain.lower() == 'b':
         sses = gain_obj.sdb_sheets
 
+    # Local references to the GainDomain attributes used per residue in the loop below
+    gain_start = gain_obj.start
+    sse_sequence = gain_obj.sse_sequence
+
     # Go through each individual SSE in the GAIN SSE dictionary
     for idx, sse in enumerate(sses):
-        first_res, last_res = sse[0]+gain_obj.start, sse[1]+gain_obj.start
+        first_res, last_res = sse[0]+gain_start, sse[1]+gain_start
 
         exact_match = False                             # This is set to True, otherwise continue to Interval search
         fuzzy_match = False                             # Flag for successful Interval search detection
@@ -185,11 +193,12 @@ def create_subdomain_indexing(gain_obj, subdomain, actual_centers, threshold=3,
 
                 coiled_residues = []
                 outlier_residues = []
-                for i in range(sse[0]+gain_obj.start, sse[1]+1+gain_obj.start):
-                    if gain_obj.sse_sequence[i] ==  "C":
-                        coiled_residues.append(i-gain_obj.start)
-                    if gain_obj.sse_sequence[i] in ['h','e']:
-                        outlier_residues.append(i-gain_obj.start)
+                for i in range(sse[0]+gain_start, sse[1]+1+gain_start):
+                    sse_letter = sse_sequence[i]
+                    if sse_letter ==  "C":
+                        coiled_residues.append(i-gain_start)
+                    if sse_letter in ['h','e']:
+                        outlier_residues.append(i-gain_start)
 
                 if debug:
                     print(f"[DEBUG] GainDomain.create_indexing :\n\t{coiled_residues  = }\n\t{outlier_residues = }")
@@ -210,8 +219,7 @@ def create_subdomain_indexing(gain_obj, subdomain, actual_centers, threshold=3,
                     f"{sse_adj_2  = },\t{name_2 = },\t{cast_2 =  }")
                 nom_list, indexing_dir, indexing_centers = cast(nom_list, indexing_dir, indexing_centers, sse_adj_2, name_2, cast_2)
                 # Also write split stuff to the new dictionary
-                for entryidx, entry in enumerate(name_2):
-                    named_residue_dir[entry] = entryidx+sse_adj[0]
+                named_residue_dir.update(zip(name_2, itertools.count(sse_adj[0])))
 
         # if no exact match is found, the center does not exist in this domain
         if exact_match == False:
@@ -229,13 +237,11 @@ def create_subdomain_indexing(gain_obj, subdomain, actual_centers, threshold=3,
         if ambiguous == False and exact_match == True or fuzzy_match == True:
                 nom_list, indexing_dir, indexing_centers = cast(nom_list, indexing_dir, indexing_centers, [first_res, last_res], name_list, cast_values)
                 # Also cast to general indexing dictionary
-                for namidx, entry in enumerate(name_list):
-                    named_residue_dir[entry] = namidx+first_res
+                named_residue_dir.update(zip(name_list, itertools.count(first_res)))
         elif ambiguous == True:
                 nom_list, indexing_dir, indexing_centers = cast(nom_list, indexing_dir, indexing_centers, sse_adj, name_list, cast_values)
                 # Also cast to general indexing dictionary
-                for namidx, entry in enumerate(name_list):
-                    named_residue_dir[entry] = namidx+sse_adj[0]
+                named_residue_dir.update(zip(name_list, itertools.count(sse_adj[0])))
         else: # If there is an unadressed SSE with length 3 or more, then add this to unindexed.
                 if sse[1]-sse[0] >= threshold:
                     if debug: print(f"[DEBUG] GainDomain.create_indexing : No center found! \n {first_res = } \ns{last_res = }")
@@ -563,10 +569,14 @@ def create_compact_indexing(gain_obj, subdomain:str, actual_centers:dict,
     elif subdomain.lower() == 'b':
         sses = gain_obj.sdb_sheets
 
+    # Local references to the GainDomain attributes used per residue in the loop below
+    gain_start = gain_obj.start
+    sse_sequence = gain_obj.sse_sequence
+
     # Go through each individual SSE in the GAIN SSE dictionary
     for idx, sse in enumerate(sses):
 
-        first_res, last_res = sse[0]+gain_obj.start, sse[1]+gain_obj.start # These are PDB-matching indices
+        first_res, last_res = sse[0]+gain_start, sse[1]+gain_start # These are PDB-matching indices
 
         if debug:print(f"[DEBUG] create_compact_indexing : \nNo. {idx+1}: {sse}\n{first_res = }, {last_res = }")
 
@@ -596,8 +606,7 @@ def create_compact_indexing(gain_obj, subdomain:str, actual_centers:dict,
             # name_list has the assignment for the SSE, cast_values contains the passed values for dict casting
             nom_list, indexing_dir, indexing_centers = cast(nom_list, indexing_dir, indexing_centers, tr_sse, name_list, cast_values)
             # Also write split stuff to the new dictionary
-            for entryidx, entry in enumerate(name_list):
-                named_residue_dir[entry] = entryidx + first_res
+            named_residue_dir.update(zip(name_list, itertools.count(first_res)))
             continue
 
         if n_found_centers > 1:
@@ -609,9 +618,10 @@ def create_compact_indexing(gain_obj, subdomain:str, actual_centers:dict,
             coiled_residues = []
             outlier_residues = []
             for i in range(first_res+1, last_res): # The start and end of a segment are never breaks.
-                if gain_obj.sse_sequence[i] ==  "C" or gain_obj.sse_sequence[i] == "T":
+                sse_letter = sse_sequence[i]
+                if sse_letter ==  "C" or sse_letter == "T":
                     coiled_residues.append(i)
-                if gain_obj.sse_sequence[i] in ['h', 'e']:
+                if sse_letter in ['h', 'e']:
                     outlier_residues.append(i)
 
             if debug:
@@ -631,8 +641,7 @@ def create_compact_indexing(gain_obj, subdomain:str, actual_centers:dict,
                 # cast them also?
                 nom_list, indexing_dir, indexing_centers = cast(nom_list, indexing_dir, indexing_centers, tr_segment, name_list, cast_values)
                  # Also write split stuff to the new dictionary
-                for entryidx, entry in enumerate(name_list):
-                    named_residue_dir[entry] = entryidx+tr_segment[0]
+                named_residue_dir.update(zip(name_list, itertools.count(tr_segment[0])))
 
     # Second pass: Check for overlapping unindexed template elements:
     if template_extents is not None:
@@ -705,8 +714,7 @@ def create_compact_indexing(gain_obj, subdomain:str, actual_centers:dict,
                         # Update with new elements
                         nom_list, indexing_dir, indexing_centers = cast(nom_list, indexing_dir, indexing_centers, sse, name_list, cast_values)
 
-                        for entryidx, entry in enumerate(name_list):
-                            named_residue_dir[entry] = entryidx+sse[0]
+                        named_residue_dir.update(zip(name_list, itertools.count(sse[0])))
 
                         if debug:
                             print(f"[DEBUG] create_compact_indexing :\n\tFound offset Element {name} @ {target_center_res}\n\tTemplate: {extent}\n\t Target: {sse}\n\t{name_list = }\n\t{cast_values = }")
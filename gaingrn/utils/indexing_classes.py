@@ -5,17 +5,18 @@
 
 import numpy as np
 import gaingrn.utils.assign
-import glob
+import gaingrn.utils.io
 import multiprocessing as mp
 
 class StAlIndexing:
     def __init__(self, list_of_gain_obj, prefix:str, pdb_dir:str,  template_dir:str, template_json:str, gesamt_bin:str, 
                  n_threads=1, outlier_cutoff=10.0, fasta_offsets=None, pseudocenters=None, debug=False):
 
+        # Scan the PDB directory once instead of globbing it for every GAIN domain
+        pdb_index = gaingrn.utils.io.build_file_index(pdb_dir, suffix=".pdb")
+
         def find_pdb(name, pdb_folder):
-            identifier = name.split("-")[0]
-            target_pdb = glob.glob(f"{pdb_folder}/*{identifier}*.pdb")[0]
-            return target_pdb
+            return gaingrn.utils.io.find_pdb(name, pdb_folder, index=pdb_index)
 
         length = len(list_of_gain_obj)
         total_keys = []
@@ -2,7 +2,9 @@
 #   contains functions for file input/output operations and running commands like STRIDE as command line.
 
 import os, json, re, glob, shlex, shutil, requests, tarfile
-from subprocess import PIPE, Popen
+from subprocess import PIPE, Popen, run
+from collections import Counter
+from functools import lru_cache
 import numpy as np
 import pandas as pd
 import multiprocessing as mp
@@ -51,28 +53,18 @@ def run_command(cmd, out_file=None, cwd=None):
      # wrapper for running a command line argument
     if not cwd:
         cwd = os.getcwd()
+    # Output is collected in one go instead of being read through a 10-byte pipe buffer
     if out_file:
-        out = open(out_file, 'w')
-        out.flush()
-        p = Popen(shlex.split(cmd), stdout=out, stderr=PIPE, bufsize=10, universal_newlines=True, cwd=cwd)
-    else:
-        p = Popen(shlex.split(cmd), stdout=PIPE, stderr=PIPE, bufsize=10, universal_newlines=True, cwd=cwd)
-        for line in p.stdout:
+        with open(out_file, 'w') as out:
+            p = run(shlex.split(cmd), stdout=out, stderr=PIPE, universal_newlines=True, cwd=cwd)
+        for line in p.stderr.splitlines(keepends=True):
             print(line)
-    if out_file:
-        for line in p.stderr:
+    else:
+        p = run(shlex.split(cmd), stdout=PIPE, stderr=PIPE, universal_newlines=True, cwd=cwd)
+        for line in p.stdout.splitlines(keepends=True):
             print(line)
 
-    exit_code = p.poll()
-    # Discard all outputs
-    _ = p.communicate()
-
-    if out_file:
-        out.close()
-
-    p.terminate()
-
-    return exit_code
+    return p.returncode
 
 def run_logged_command(cmd, logfile=None, outfile=None):
     # The command would be the whole command line, in this case the gesamt command.
@@ -112,47 +104,187 @@ def compile_stride_mp_list(pdbs, stride_folder, stride_bin):
     return stride_mp_list
 
 def execute_stride_mp(stride_mp_list, n_threads=10):
-    # multiprocessed variant wrapper
-    stride_pool = mp.Pool(n_threads)
-    stride_pool.map(run_stride, stride_mp_list)
+    # multiprocessed variant wrapper, each entry of stride_mp_list is unpacked into run_stride(pdb_file, out_file, stride_bin)
+    with mp.Pool(n_threads) as stride_pool:
+        stride_pool.starmap(run_stride, stride_mp_list)
     print("Completed mutithreaded creation of STRIDE files!")
 
+def run_stride_batch(pdb_files, out_dir, stride_bin, n_threads=None):
+    # Runs STRIDE for all PDB files in parallel, outputs are named as in compile_stride_mp_list.
+    # n_threads=None uses all available cores.
+    os.makedirs(out_dir, exist_ok=True)
+    stride_mp_list = compile_stride_mp_list(pdb_files, out_dir, stride_bin)
+    execute_stride_mp(stride_mp_list, n_threads=n_threads)
+
 #read_write
 
-def read_sse_loc(file):
+# Buffer for reading the (potentially large) STRIDE, FASTA and pLDDT files and writing FASTA files, default would be 8 KiB
+_IO_BUFFER = 1 << 20
+
+# STRIDE ASG records are fixed-width (see also bb_angle_tools), the columns are sliced directly from the line:
+#          1         2         3         4         5         6         7
+#0123456789012345678901234567890123456789012345678901234567890123456789012345678
+#ASG  SER A  459  454    e        Strand    -66.77    156.86      10.4      2.97
+def _asg_columns(l):
+    # PDB index, SSE letter, PHI, PSI and outlier (empty if the file has no outlier column)
+    return l[10:15], l[24:25], l[42:51], l[51:61], l[71:].strip()
+
+def _loc_columns(l):
+    # SSE type, first and last PDB index. LOC lines are split only up to the last needed field
+    #  0   1          2     3 4      5      6 7
+    #LOC  AlphaHelix   VAL   100 A      GLN    105 A                            ~~~~
+    items = l.split(None, 7)
+    return items[1], items[3], items[6]
+
+def _file_version(file):
+    # Key of the in-memory file caches: (absolute path, mtime, size, inode). A file replaced at the same path with the same mtime
+    # (rewritten within the mtime granularity, extracted from an archive or copied with cp -p) still yields a new key.
+    stat = os.stat(file)
+    return os.path.abspath(file), stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+@lru_cache(maxsize=4)
+def _read_stride_records(file, mtime_ns, size, inode):
+    # One pass over a STRIDE file collecting the raw LOC, ASG and SEQ lines (as bytes). Binary line iteration skips
+    # the decoding of all other records. Cached per file version (path, mtime, size and inode), since the LOC, ASG and angle
+    # parsers usually run right after each other on the same file. Only the last few files are kept.
+    records = {b"LOC":[], b"ASG":[], b"SEQ":[]}
+    with open(file, "rb", buffering=_IO_BUFFER) as f:
+        for l in f:
+            tag_lines = records.get(l[:3])
+            if tag_lines is not None:
+                tag_lines.append(l)
+    return {tag:tuple(lines) for tag, lines in records.items()}
+
+
+def _iter_tagged_lines(file, tag:bytes):
+    # Yields only the raw lines (as bytes) of a STRIDE file starting with the record tag, i.e. b"ASG".
+    return iter(_read_stride_records(*_file_version(file))[tag])
+
+
+def _read_stride_columns(file, tag:bytes, columns, cache=False):
+    # Returns the columns extracted by columns(line) of all lines starting with the record tag as a list of byte sequences
+    # (one per line).
+    # With cache=True, the columns are stored next to the STRIDE file as <file>.<tag>.npz and re-used on later calls
+    # as long as the STRIDE file has not been modified or resized since.
+    if cache:
+        cache_file = f"{file}.{tag.decode()}.npz"
+        stat = os.stat(file)
+        try:
+            if os.stat(cache_file).st_mtime >= stat.st_mtime:
+                with np.load(cache_file) as cached:
+                    if cached["size"] == stat.st_size:
+                        return cached["columns"].tolist()
+        except (OSError, ValueError, KeyError):
+            pass
+
+    rows = [columns(l) for l in _iter_tagged_lines(file, tag)]
+
+    if cache:
+        # write to a temporary file first, parallel readers should never see a partial cache
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp.npz"
+        try:
+            np.savez(tmp_file, columns=np.array(rows, dtype=bytes), size=stat.st_size)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print(f"WARNING: Could not write STRIDE cache {cache_file}: {e}")
+    return rows
+
+
+def read_sse_loc(file, cache=False):
     '''
     STRIDE output file parsing function, returns the FULL sequence of SSE data (N->C direction)
     Parameters : 
         file : str, required
             STRIDE file to be read. 
+        cache : bool, optional
+            Store the parsed LOC records as <file>.LOC.npz and re-use them while the STRIDE file is unchanged
     Returns 
         sseDict : dict
             Dictionary containing all SSE with respective names and intervals by residue
     '''
     sseDict = {}
 
-    with open(file) as f:
-
-        for l in f.readlines():
-
-            if l.startswith("LOC"):     # ASG is the per-residue ASSIGNMENT of SSE
-                                        # LOC is already grouped from [start - ]
-                items = l.split(None)   # [24] has the SSE one-letter code
-                sse, first, last = items[1], int(items[3]), int(items[6])
-
-                if sse not in sseDict.keys():
-                    sseDict[sse] = [(first, last)]
-                else:
-                    sseDict[sse].append((first,last))
+    # ASG is the per-residue ASSIGNMENT of SSE, LOC is already grouped from [start - ]
+    for sse, first, last in _read_stride_columns(file, b"LOC", _loc_columns, cache=cache):
+        sseDict.setdefault(sse.decode(), []).append((int(first), int(last)))
     return sseDict
 
 
-def read_sse_asg(file):
+class SseTable:
+    '''
+    Column-wise (struct-of-arrays) representation of the STRIDE LOC records of one file, N->C ordered as in the file.
+    Complements the dictionary returned by read_sse_loc() for vectorized range queries.
+
+    Attributes
+    ----------
+    codes : numpy array
+        The SSE type of each record (AlphaHelix, Strand, ...)
+    firsts : numpy array
+        The first PDB residue index of each record (int32)
+    lasts : numpy array
+        The last PDB residue index of each record (int32)
+
+    Methods
+    ---------
+    lookup(code)
+        Returns all [first, last] intervals of the SSE type as a 2-column array
+    to_dict()
+        Returns the intervals grouped by SSE type, identical to read_sse_loc()
+    cut(start, end)
+        Returns a new SseTable with only the records within the domain boundaries, as structure_utils.cut_sse_dict()
+    '''
+    def __init__(self, codes, firsts, lasts):
+        self.codes = np.asarray(codes, dtype=str)
+        self.firsts = np.asarray(firsts, dtype=np.int32)
+        self.lasts = np.asarray(lasts, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def lookup(self, code):
+        mask = self.codes == code
+        return np.column_stack((self.firsts[mask], self.lasts[mask]))
+
+    def to_dict(self):
+        sseDict = {}
+        for sse, first, last in zip(self.codes.tolist(), self.firsts.tolist(), self.lasts.tolist()):
+            sseDict.setdefault(sse, []).append((first, last))
+        return sseDict
+
+    def cut(self, start, end):
+        # One vectorized pass over all records instead of a loop per SSE type.
+        # As in cut_sse_dict(), an SSE exceeding both boundaries is only truncated at the start.
+        keep = (self.firsts <= end) & (self.lasts >= start)
+        firsts, lasts = self.firsts[keep], self.lasts[keep]
+        cut_start = firsts < start
+        return SseTable(self.codes[keep],
+                        np.where(cut_start, start, firsts),
+                        np.where(~cut_start & (lasts > end), end, lasts))
+
+
+def read_sse_table(file, cache=False):
+    # Parses the LOC records of a STRIDE file in one pass into an SseTable. Parameters as in read_sse_loc()
+    loc_rows = _read_stride_columns(file, b"LOC", _loc_columns, cache=cache)
+    if not loc_rows:
+        return SseTable([], [], [])
+    codes, firsts, lasts = zip(*loc_rows)
+    return SseTable(b" ".join(codes).decode().split(), np.array(firsts, dtype=np.int32), np.array(lasts, dtype=np.int32))
+
+
+def _read_asg_columns(file, cache=False):
+    # Single pass over the ASG lines of a STRIDE file, returns a list of byte sequences with one entry per residue:
+    # (PDB index, SSE letter, PHI, PSI, outlier)
+    return _read_stride_columns(file, b"ASG", _asg_columns, cache=cache)
+
+
+def read_sse_asg(file, cache=False):
     '''
     STRIDE output file parsing function, used for modified stride files contaning outliers as lowercase letters (H - h, G - g)
     Parameters : 
     file : str, required
             STRIDE file to be read. 
+    cache : bool, optional
+            Store the parsed ASG records as <file>.ASG.npz and re-use them while the STRIDE file is unchanged
     Returns 
         residue_sse : dict
             DICT containing a sequence of all letters assigned to the residues with the key being the present residue
@@ -160,36 +292,28 @@ def read_sse_asg(file):
             DICT containing all outlier residues outside of 2 sigma with the respectve float multiple of StdDev
     '''
 
-    with open(file) as f:
-        lines = f.readlines()
-    asgs = [l for l in lines if l.startswith("ASG")]
-
-    first_res = int(asgs[0].split(None)[3])
-    last_res = int(asgs[-1].split(None)[3])
-    residue_sse = {k:"X" for k in range(first_res, last_res+1)}
-    outliers = {}
-    for l in asgs:              # ASG is the per-residue ASSIGNMENT of SSE
-                                # LOC is already grouped from [start - ]
-        items = l.split(None)   # [24] has the SSE one-letter code
-        # Example lines:
-        # items[i]:
-        #  0    1 2    3    4    5             6         7         8         9        10
-        #ASG  THR A  458  453    E        Strand   -123.69    131.11       4.2      ~~~~
-        #ASG  SER A  459  454    e        Strand    -66.77    156.86      10.4      2.97
-        # 3 is the PDB index, 4 is the enumerating index, this is crucial for avoiding offsets, always take 3
-        residue_sse[int(items[3])] = items[5]
-        # if there is missing keys, just label them "X", since these are residues skipped by AlphaFold2 (i.e. "X")
-        if len(items) >= 11 and items[10] != "~~~~":
-            outliers[int(items[3])] = float(items[10])
+    asg_rows = _read_asg_columns(file, cache=cache)
+    # Example lines:
+    # items[i]:
+    #  0    1 2    3    4    5             6         7         8         9        10
+    #ASG  THR A  458  453    E        Strand   -123.69    131.11       4.2      ~~~~
+    #ASG  SER A  459  454    e        Strand    -66.77    156.86      10.4      2.97
+    # 3 is the PDB index, 4 is the enumerating index, this is crucial for avoiding offsets, always take 3
+    pdb_idx = [int(row[0]) for row in asg_rows]
+
+    # if there is missing keys, just label them "X", since these are residues skipped by AlphaFold2 (i.e. "X")
+    residue_sse = dict.fromkeys(range(pdb_idx[0], pdb_idx[-1]+1), "X")
+    residue_sse.update(zip(pdb_idx, b"".join([row[1] for row in asg_rows]).decode()))
+
+    outliers = {idx:float(row[4]) for idx, row in zip(pdb_idx, asg_rows) if row[4] not in (b"~~~~", b"")}
     return residue_sse, outliers
 
 
 def get_stride_seq(file):
-    seq_lines = [l for l in open(file).readlines() if l.startswith("SEQ")]
-    return list("".join([l.split()[2] for l in seq_lines]))
+    return list(b"".join([l.split(None, 3)[2] for l in _iter_tagged_lines(file, b"SEQ")]).decode())
 
 
-def read_stride_angles(file, filter_letter=None):
+def read_stride_angles(file, filter_letter=None, cache=False):
     '''
     STRIDE output file parsing function, used for modified stride files contaning outliers as lowercase letters (H - h, G - g)
     Parameters : 
@@ -197,6 +321,8 @@ def read_stride_angles(file, filter_letter=None):
             STRIDE file to be read. 
     filter_letter : str, optional
             Filters entries to match a pre-assigneed secondary structure letter (E, H, ...) --> items[3]
+    cache : bool, optional
+            Store the parsed ASG records as <file>.ASG.npz and re-use them while the STRIDE file is unchanged
     Returns 
         residue_sse : dict
             DICT containing PHI and PSI float values for each residue number (PDB) as key.
@@ -207,34 +333,84 @@ def read_stride_angles(file, filter_letter=None):
     #
     #ASG  SER A  459  454    E        Strand    -66.77    156.86      10.4      ~~~~
     # 3 is the PDB index, 4 is the enumerating index, this is crucial for avoiding offsets, always take 3  
-    with open(file) as f:
-        asgs = [l for l in f.readlines() if l.startswith("ASG")]
+    asg_rows = _read_asg_columns(file, cache=cache)
+    if filter_letter is not None:
+        letter = filter_letter.encode()
+        asg_rows = [row for row in asg_rows if row[1] == letter]
 
-    angles = {}
-    for l in asgs:
-        items = l.split(None)   # [24] has the SSE one-letter code
-        if filter_letter is None or filter_letter == items[5]:
-            angles[int(items[3])] = [float(items[7]), float(items[8])]
+    angles = {int(row[0]):[float(row[2]), float(row[3])] for row in asg_rows}
 
     return angles
 
 
+def _read_asg_block(file):
+    # Bulk variant of _read_asg_columns() for files where all ASG lines have the same length (i.e. unmodified STRIDE output):
+    # the joined lines are viewed as fixed-width records, so numpy converts the fields in C instead of per line in Python.
+    # Returns None if the line lengths differ.
+    asg_lines = list(_iter_tagged_lines(file, b"ASG"))
+    if not asg_lines:
+        return None
+    width = len(asg_lines[0])
+    if width < 61 or any(len(l) != width for l in asg_lines):
+        return None
+    block = b"".join(asg_lines)
+    fields = np.dtype({'names':['pdb_idx', 'sse', 'phi', 'psi'], 'formats':['S5', 'S1', 'S9', 'S10'], 'offsets':[10, 24, 42, 51], 'itemsize':width})
+    return np.frombuffer(block, dtype=fields)
+
+
+# Record layout of read_stride_angle_array()
+STRIDE_ANGLE_DTYPE = [('pdb_idx', np.int64), ('sse', 'U1'), ('phi', np.float64), ('psi', np.float64)]
+
+def read_stride_angle_array(file, filter_letter=None, cache=False):
+    '''
+    Array variant of read_stride_angles() for callers operating on all residues at once.
+    Parameters : 
+    file : str, required
+            STRIDE file to be read. 
+    filter_letter : str, optional
+            Filters entries to match a pre-assigneed secondary structure letter (E, H, ...)
+    cache : bool, optional
+            Store the parsed ASG records as <file>.ASG.npz and re-use them while the STRIDE file is unchanged
+    Returns 
+        angles : numpy structured array
+            One record per residue in file order with the fields pdb_idx, sse, phi and psi (see STRIDE_ANGLE_DTYPE)
+    '''
+    block = None if cache else _read_asg_block(file)
+    if block is not None:
+        if filter_letter is not None:
+            block = block[block['sse'] == filter_letter.encode()]
+        angles = np.empty(len(block), dtype=STRIDE_ANGLE_DTYPE)
+        for field in angles.dtype.names:
+            angles[field] = block[field]
+        return angles
+
+    asg_rows = _read_asg_columns(file, cache=cache)
+    if filter_letter is not None:
+        letter = filter_letter.encode()
+        asg_rows = [row for row in asg_rows if row[1] == letter]
+    return np.array([(int(row[0]), row[1].decode(), float(row[2]), float(row[3])) for row in asg_rows], dtype=STRIDE_ANGLE_DTYPE)
+
+
 def get_angle_outlier(sse:list, stride_file:str, phi_mean_sd, psi_mean_sd, psi_prio=True):
     # For strand outliers, prioritize PSI over PSI - with precalculated values of PHI and PSI mean+SD:
-    angles = read_stride_angles(stride_file)
-    phipsi = [phi_mean_sd, psi_mean_sd]
-    sse_angles = np.array([ angles[i] for i in range(sse[0],sse[1]) ])
+    angles = read_stride_angle_array(stride_file)
+    phipsi = np.array([phi_mean_sd, psi_mean_sd])
+    # ASG records are ordered by residue, so the SSE is one contiguous slice of the array
+    lo, hi = np.searchsorted(angles['pdb_idx'], [sse[0], sse[1]])
+    if not np.array_equal(angles['pdb_idx'][lo:hi], np.arange(sse[0], sse[1])):
+        raise KeyError(f"No PHI/PSI angles for all residues {sse[0]}-{sse[1]} in {stride_file}")
+    sse_angles = np.column_stack((angles['phi'][lo:hi], angles['psi'][lo:hi]))
 
     if psi_prio:
         order = [0,1]
     else:
         order = [1,0]
+    xangles = np.where(sse_angles < 0, sse_angles+360, sse_angles) # remove negative values for wrapping in negative angle values
+    deviance = np.abs(xangles - phipsi[:,0])
+    max_deviance = np.argmax(deviance, axis=0)
     for i in order:
-        xangles = [ x+360 if x<0 else x for x in sse_angles[:,i]] # remove negative values for wrapping in negative angle values
-        max_deviance = np.argmax( [abs(x - phipsi[i][0]) for x in xangles] )
-        #print(f"{abs(xangles[max_deviance] - phipsi[i][0]) = } | {2*phipsi[i][1] = }")
-        if abs(xangles[max_deviance] - phipsi[i][0]) > 2*phipsi[i][1]:
-            return sse[0]+max_deviance
+        if deviance[max_deviance[i], i] > 2*phipsi[i][1]:
+            return sse[0]+max_deviance[i]
     # If not outside 2 sigma, return None.
     return None
 
@@ -267,6 +443,34 @@ def read_seq(file, return_name=False):
                 return name, seq
 
 
+def _iter_fasta(file, max_len=None):
+    # Streams a FASTA file entry-wise, yielding (header, sequence) tuples without loading the whole file.
+    # With max_len, each sequence is truncated to max_len residues while reading, later lines of the entry are skipped.
+    # Lines are read as bytes, only the finished header and sequence of each entry are decoded.
+    name = None
+    seq_lines = []
+    seq_len = 0
+    with open(file, "rb", buffering=_IO_BUFFER) as f:
+        for line in f:
+            if line.startswith(b">"):
+                if name is not None:
+                    yield name, b"".join(seq_lines).decode()
+                name = line[1:].rstrip(b"\r\n").decode()
+                seq_lines = []
+                seq_len = 0
+            elif name is not None and (max_len is None or seq_len < max_len):
+                line = line.rstrip(b"\r\n")
+                if max_len is not None:
+                    line = line[:max_len-seq_len]
+                seq_lines.append(line)
+                seq_len += len(line)
+    if name is not None:
+        yield name, b"".join(seq_lines).decode()
+
+
+# Record layout of read_multi_seq(), sequences differ in length and stay Python strings
+MULTI_SEQ_DTYPE = np.dtype([('name', object), ('seq', object)])
+
 def read_multi_seq(file):
     '''
     Build a sequences object from a FASTA file contaning multiple sequences.
@@ -275,18 +479,15 @@ def read_multi_seq(file):
         file : str, required
             The FASTA file to be read
     Returns:
-        sequences : object
-        A list contaning one tuple per sequence with (name, sequence)
+        sequences : numpy structured array
+        One (name, sequence) record per sequence (dtype MULTI_SEQ_DTYPE). Records behave like tuples,
+        whole columns are accessible via sequences["name"] and sequences["seq"].
     '''
-    with open(file) as f:
-        data = f.read()
-        entries = data.strip().split(">")
-        entries = list(filter(None, entries))
-    sequences = np.empty([len(entries)], dtype=tuple)
-
-    for i, entry in enumerate(entries):
-        name, sequence = entry.strip().split("\n")
-        sequences[i] = (name, sequence)
+    entries = [(name.strip(), sequence.strip()) for name, sequence in _iter_fasta(file)]
+    # Filled field-wise, np.fromiter() only supports object fields from numpy 1.23 on
+    sequences = np.empty([len(entries)], dtype=MULTI_SEQ_DTYPE)
+    if entries:
+        sequences["name"], sequences["seq"] = zip(*entries)
 
     return sequences
 
@@ -306,23 +507,100 @@ def read_alignment(alignment, cutoff=-1):
             a dictionary with {sequence_name}:{sequence} as items
     '''
     sequences = {}
+    # Only the first $cutoff characters are kept, so sequences are truncated while reading instead of after joining all lines.
+    max_len = cutoff if cutoff >= 0 else None
 
-    with open(alignment) as f:
+    for name, sequence in _iter_fasta(alignment, max_len=max_len):
+        sequences[name.split("/")[0]] = sequence[:cutoff]
 
-        data = f.read()
-        seqs = data.split(">")
+    return sequences
 
-        for seq in seqs[1:]: # First item is empty
 
-            sd = seq.splitlines()
+class FastaIndex:
+    '''
+    Byte-offset index of the entries in a (large) FASTA alignment file. Single sequences are read on demand
+    with one seek, instead of loading the whole alignment via read_alignment().
+
+    Attributes
+    ----------
+    fasta_file : str
+        The indexed FASTA file
+    offsets : dict
+        {sequence_name}:(offset, length) of the sequence lines of each entry, names as in read_alignment()
+
+    Methods
+    ---------
+    fetch(name, cutoff=-1)
+        Returns the sequence of the entry, identical to read_alignment(fasta_file, cutoff)[name], None if not present
+    '''
+    def __init__(self, fasta_file, cache=False):
+        '''
+        Parameters:
+            fasta_file : str, required
+                An Alignment file in FASTA format
+            cache : bool, optional
+                Store the offsets as <fasta_file>.fidx and re-use them while the FASTA file is unchanged
+        '''
+        self.fasta_file = fasta_file
+        self.offsets = None
+        stat = os.stat(fasta_file)
+        cache_file = f"{fasta_file}.fidx"
+        if cache:
             try:
-                sd[0] = sd[0].split("/")[0]
-            except:
+                if os.stat(cache_file).st_mtime >= stat.st_mtime:
+                    with open(cache_file) as c:
+                        cached = json.load(c)
+                    if cached["size"] == stat.st_size:
+                        self.offsets = {name:tuple(entry) for name, entry in cached["offsets"].items()}
+            except (OSError, ValueError, KeyError):
                 pass
 
-            sequences[sd[0]] = "".join(sd[1:])[:cutoff]
-
-    return sequences
+        if self.offsets is None:
+            self.offsets = self._scan()
+            if cache:
+                # write to a temporary file first, parallel readers should never see a partial cache
+                tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+                try:
+                    with open(tmp_file, "w") as c:
+                        json.dump({"size":stat.st_size, "offsets":self.offsets}, c)
+                    os.replace(tmp_file, cache_file)
+                except OSError as e:
+                    print(f"WARNING: Could not write FASTA index {cache_file}: {e}")
+
+    def _scan(self):
+        # One pass over the lines, only the headers are decoded. As in read_alignment(), a later entry with the same name wins.
+        offsets = {}
+        name = None
+        pos = 0
+        body_start = 0
+        with open(self.fasta_file, "rb", buffering=_IO_BUFFER) as f:
+            for line in f:
+                if line.startswith(b">"):
+                    if name is not None:
+                        offsets[name] = (body_start, pos-body_start)
+                    name = line[1:].rstrip(b"\r\n").decode().split("/")[0]
+                    body_start = pos+len(line)
+                pos += len(line)
+        if name is not None:
+            offsets[name] = (body_start, pos-body_start)
+        return offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, name):
+        return name in self.offsets
+
+    def fetch(self, name, cutoff=-1):
+        entry = self.offsets.get(name)
+        if entry is None:
+            return None
+        offset, length = entry
+        with open(self.fasta_file, "rb") as f:
+            f.seek(offset)
+            body = f.read(length)
+        sequence = b"".join(body.splitlines()).decode()
+        return sequence[:cutoff]
 
 
 def read_quality(jal):
@@ -346,8 +624,7 @@ def read_quality(jal):
 
             if "Blosum62" in line[:200]:
                 data = line.strip(" \t\r\n").split("|")
-            else:
-                continue
+                break # JALVIEW exports a single Blosum62 quality row, the rest of the file is not needed
 
         if not data: # Sometimes, BLOSUM62 data is not contained in the annotation file
 
@@ -355,28 +632,71 @@ def read_quality(jal):
             return None
 
     # Process the raw data into a list
-    cut_data=[]
-    [cut_data.append(float(i.split(",")[1][:5])) for i in data if len(i) > 0]
+    cut_data = [float(i.split(",", 2)[1][:5]) for i in data if i]
 
     return cut_data
 
 def read_plddt_tsv(file='all_plddt.tsv'):
     # Load the pLDDT file into a dictionary
     plddt_dir = {}
-    with open(file) as f:
-        data = [l.strip() for l in f.readlines()[1:]]
-        for l in data:
-            i,v  = tuple(l.split("\t"))
+    with open(file, buffering=_IO_BUFFER) as f:
+        f.readline() # skip the header
+        for l in f:
+            i,v  = tuple(l.strip().split("\t"))
             plddt_dir[i] = [float(val) for val in v.split(",")]
     return plddt_dir
 
-def find_pdb(name, pdb_folder):
+def _file_identifier(name):
+    # The identifier of a GAIN name or file name (without suffix) is the part up to the first "-", i.e. the UniProtKB Accession
+    return name.split("-")[0]
+
+def build_file_index(folder, suffix=".pdb"):
+    # Scans a directory once and maps the identifier of each file with the suffix to its path. The suffix is removed first,
+    # so files without "-" are keyed by their bare name. If several files share an identifier, the first one found is kept.
+    # Pass this as index to find_pdb() or find_stride_file() (i.e. with suffix="_0.stride") when looking up many files in the same directory.
+    file_index = {}
+    for entry in os.scandir(folder):
+        if entry.name.endswith(suffix):
+            file_index.setdefault(_file_identifier(entry.name[:len(entry.name)-len(suffix)]), entry.path)
+    return file_index
+
+def find_pdb(name, pdb_folder, index=None):
     # Finds a PDB within a directory containing the UniProtKB Accession of the provided Gain name.
-    identifier = name.split("-")[0]
-    target_pdb = glob.glob(f"{pdb_folder}/*{identifier}*.pdb")[0] # raises IndexError if not found.
-    return target_pdb
+    # If an index from build_file_index() is provided, look up the identifier there first.
+    identifier = _file_identifier(name)
+    if index is not None and identifier in index:
+        return index[identifier]
+    # Same match as glob("*{identifier}*.pdb") (including skipping hidden files), but stops at the first hit
+    for entry in os.scandir(pdb_folder):
+        if entry.name.endswith(".pdb") and identifier in entry.name and not entry.name.startswith("."):
+            return entry.path
+    raise FileNotFoundError(f"No PDB matching {identifier!r} under {pdb_folder}")
+
+def _dir_mtime(path_pattern):
+    # Modification time of the directory holding the glob pattern, used to invalidate _list_stride_files().
+    # The mtime only changes with the direct children of the directory. Returns None for a wildcard in the directory part
+    # (i.e. "sigma_*/*.stride") or a missing directory, where no single mtime covers all matches.
+    dir_name = os.path.dirname(path_pattern)
+    if glob.has_magic(dir_name):
+        return None
+    try:
+        return os.stat(dir_name or ".").st_mtime_ns
+    except OSError:
+        return None
 
-def find_stride_file(name, path="stride_out/*_0.stride"):
+@lru_cache(maxsize=8)
+def _cached_stride_files(path_pattern, dir_mtime):
+    return tuple(glob.glob(path_pattern))
+
+def _list_stride_files(path_pattern):
+    # The glob result of a STRIDE collection, listed once per directory state instead of once per find_stride_file() call.
+    # Patterns without a usable directory mtime (see _dir_mtime()) are globbed on every call.
+    dir_mtime = _dir_mtime(path_pattern)
+    if dir_mtime is None:
+        return tuple(glob.glob(path_pattern))
+    return _cached_stride_files(path_pattern, dir_mtime)
+
+def find_stride_file(name, path="stride_out/*_0.stride", index=None):
     '''
     Finds the STRIDE file in a collection of stride files,
     then reads SSE info from this found file via read_sse_loc()
@@ -387,29 +707,85 @@ def find_stride_file(name, path="stride_out/*_0.stride"):
             The name of the sequence, corresponding to the search string
         path : str, optional
             The glob.glob() string to find the STRIDE file collection. default = stride_out/*_0.stride
+            The listing is re-used while the mtime of the pattern directory is unchanged. Since this mtime only reflects its direct
+            children, patterns with a wildcard in the directory part (i.e. sigma_*/*.stride) are globbed on every call.
+        index : dict, optional
+            A prebuilt build_file_index() of the STRIDE folder. Skips scanning the collection if the identifier of name is contained.
 
     Returns:
         sse_dict : dict
             The dictionary containng SSE data as in read_sse_loc()
     '''
-    stride_files = glob.glob(path) #_0 indicates that only the best model SSE data is evaluated
-    strides = [st for st in stride_files if name in st]
+    if index is not None and _file_identifier(name) in index:
+        return read_sse_loc(index[_file_identifier(name)])
+
+    stride_files = _list_stride_files(path) #_0 indicates that only the best model SSE data is evaluated
+    stride_file = next((st for st in stride_files if name in st), None)
 
-    if len(strides) == 0:
+    if stride_file is None:
         print("ERROR: Stride files not found in here. {name = }")
         return None
 
-    sse_dict = read_sse_loc(strides[0])
+    sse_dict = read_sse_loc(stride_file)
     return sse_dict
 
 
+def parse_stride(file):
+    # Reads everything a GainDomain takes from a STRIDE file: (sse_dict, residue_sse, outliers) as in read_sse_loc() and read_sse_asg()
+    return (read_sse_loc(file), *read_sse_asg(file))
+
+def load_all_strides(names, path="stride_out/*_0.stride", n_threads=10, chunksize=16, full=False):
+    '''
+    Batch variant of find_stride_file(). Scans the STRIDE file collection once and reads
+    the SSE info of all matching files in parallel via read_sse_loc()
+
+    Parameters:
+        names : list, required
+            The names of the sequences, each corresponding to a search string
+        path : str, optional
+            The glob.glob() string to find the STRIDE file collection. default = stride_out/*_0.stride
+        n_threads : int, optional
+            Number of worker processes parsing the STRIDE files. default = 10
+        chunksize : int, optional
+            Number of files handed to a worker at once, amortizes the inter-process communication. default = 16
+        full : bool, optional
+            If True, read everything a GainDomain takes from each file via parse_stride() instead of only the SSE dictionary.
+            default = False
+
+    Returns:
+        sse_dicts : dict
+            A dictionary with {name}:{sse_dict} as items, sse_dict being None if no STRIDE file was found.
+            With full=True, the items are {name}:(sse_dict, residue_sse, outliers)
+    '''
+    stride_files = glob.glob(path)
+    name_files = {}
+
+    for name in names:
+        strides = [st for st in stride_files if name in st]
+        if len(strides) == 0:
+            print(f"ERROR: Stride files not found in here. {name = }")
+            continue
+        name_files[name] = strides[0]
+
+    with mp.Pool(n_threads) as stride_pool:
+        parsed = stride_pool.map(parse_stride if full else read_sse_loc, list(name_files.values()), chunksize=chunksize)
+
+    sse_dicts = dict.fromkeys(names)
+    sse_dicts.update(zip(name_files.keys(), parsed))
+    return sse_dicts
+
 def filter_by_list(sequences, selection):
-    # Same as filter_by_receptor, instead using a list as input
+    # Same as filter_by_receptor, instead using a list as input.
+    # A sequence is added once per selection item contained in its name. Instead of testing every item against every name,
+    # all name substrings with the lengths of the selection items are looked up in a set of the items.
+    counts = Counter(selection)
+    lengths = set(map(len, counts))
     new_list = []
     for seq_tup in sequences:
-        for it in selection:
-            if it in seq_tup[0]:
-                new_list.append(seq_tup)
+        name = seq_tup[0]
+        found = {name[i:i+l] for l in lengths for i in range(len(name)-l+1)}.intersection(counts)
+        for it in found:
+            new_list.extend([seq_tup]*counts[it])
     return new_list
 
 
@@ -417,6 +793,9 @@ def filter_by_list(sequences, selection):
 
 def filter_by_receptor(sequences, selection):
     # Filter a selection for the receptor
+    if isinstance(sequences, np.ndarray) and sequences.dtype == MULTI_SEQ_DTYPE:
+        # read_multi_seq() output: match all names at once, returned as a list of (name, sequence) tuples as well
+        return sequences[np.char.find(sequences["name"].astype(str), selection) != -1].tolist()
     new_list = []
     for seq_tup in sequences:
         if selection in seq_tup[0]:
@@ -435,8 +814,10 @@ def write2fasta(sequence, name, filename):
             The name to be put into the header of the FASTA
         filename: str, required
             The file name'''
-    with open(filename, 'w') as fa:
-        fa.write(f'>{name}\n{sequence}')
+    # Header and sequence are written separately, long sequences are not copied into a joined string first
+    with open(filename, 'w', buffering=_IO_BUFFER) as fa:
+        fa.write(f'>{name}\n')
+        fa.write(str(sequence))
     print(f'NOTE: Written {name} to fasta in {filename}.')
 
 def label2b(pdbfile, outfile, res2label, clear_b=False):
@@ -529,13 +910,12 @@ def grn2csv(res2label, outfile, target_gain):
 
 
 def run_mafft(mafft_bin, args, copied_fasta):
-	# call MAFFT twice, once for the map (where the truncating can be refined), once for outputting alignment
+	# call MAFFT once: --mapout writes the map (where the truncating can be refined) next to the added fasta,
+	# while the alignment itself is still written to stdout, so a second run without --mapout is not needed.
 	# the fasta should be in the outdir/alignment, since the map will be created there too
-	mafft_map_command = f"{mafft_bin} --add {copied_fasta} --keeplength --thread {args.nt} --mapout {args.source_alignment}"
-	mafft_aln_command = f"{mafft_bin} --add {copied_fasta} --keeplength --thread {args.nt} {args.source_alignment}"
+	mafft_command = f"{mafft_bin} --add {copied_fasta} --keeplength --thread {args.nt} --mapout {args.source_alignment}"
 
-	run_command(mafft_map_command, out_file=f"{args.outdir}/alignment/tmp.fa")
-	run_command(mafft_aln_command, out_file=f"{args.outdir}/alignment/appended_alignment.fa")
+	run_command(mafft_command, out_file=f"{args.outdir}/alignment/appended_alignment.fa")
 
 	return f"{copied_fasta}.map"
 
@@ -3,6 +3,7 @@
 
 import re
 import numpy as np
+from scipy.ndimage import uniform_filter1d
 
 def detect_GPS(alignment_indices, gps_minus_one, debug=False):
     '''
@@ -19,14 +20,15 @@ def detect_GPS(alignment_indices, gps_minus_one, debug=False):
         gps_center : int
             The residue index of the GAIN domain residue matching the specified alignment index
     '''
-    try: 
-        gps_center = np.where(alignment_indices == gps_minus_one)[0][0]
-        return gps_center
-    except IndexError:
-        if debug:   
-            print("[WARNING] sse_func.detect_GPS: GPS-1 column is empty. Returning empty for alternative Detection.")
-            print(f"\t{gps_minus_one  = }\n\t{alignment_indices[-15:] = }")
-        return None
+    # The mapper from get_indices() is not monotonic (truncated residues are -1, unmatched trailing residues 0),
+    # so the first match is taken from the boolean mask instead of a binary search.
+    is_gps = np.asarray(alignment_indices) == gps_minus_one
+    if is_gps.any():
+        return is_gps.argmax()
+    if debug:   
+        print("[WARNING] sse_func.detect_GPS: GPS-1 column is empty. Returning empty for alternative Detection.")
+        print(f"\t{gps_minus_one  = }\n\t{alignment_indices[-15:] = }")
+    return None
 
 def detect_signchange(signal_array, exclude_zero=False, check=False):
     ''' 
@@ -50,12 +52,17 @@ def detect_signchange(signal_array, exclude_zero=False, check=False):
     sz = asign == 0                 # A boolean list where True means that asign is zero
 
     if exclude_zero == True:        #  Exclude where the value is EXACTLY zero, 0 has an unique sign [-x,0,x]
-        while sz.any(): 
-            asign[sz] = np.roll(asign, 1)[sz]
-            sz = asign == 0
-    
-    signchange = ((np.roll(asign, 1) - asign) != 0).astype(int)
-    boundaries = np.asarray(signchange != 0).nonzero()[0]
+        nonzero = np.flatnonzero(~sz)
+        if nonzero.size > 0:
+            # Forward-fill each zero with the sign of the previous non-zero value in one pass,
+            # leading zeros wrap around to the last non-zero value of the array
+            fill_idx = np.where(sz, -1, np.arange(len(asign)))
+            np.maximum.accumulate(fill_idx, out=fill_idx)
+            fill_idx[fill_idx == -1] = nonzero[-1]
+            asign = asign[fill_idx]
+
+    # Sign change with respect to the previous value, the first value is compared to the last (array wrap)
+    boundaries = np.flatnonzero(np.diff(asign, prepend=asign[-1:]))
     if boundaries.shape[0] == 0:
         print("WARNING: No boundaries detected!")
         return None
@@ -102,18 +109,16 @@ def find_boundaries(sse_dict, seq_len, bracket_size=50, domain_threshold=50, coi
             The residues index of the Subdomain boundary between A (helical) and B (sheet)
     '''
     # Check if the dictionary even contains AlphaHelices, and also check for 310Helix
-    helices = []
-    sheets = []
-    if 'AlphaHelix' not in sse_dict.keys() or 'Strand' not in sse_dict.keys():
+    if 'AlphaHelix' not in sse_dict or 'Strand' not in sse_dict:
         print("This is not a GAIN domain.")
         return None, None
 
-    [helices.append(h) for h in sse_dict['AlphaHelix']]
+    helices = list(sse_dict['AlphaHelix'])
 
-    if '310Helix' in sse_dict.keys(): 
-        [helices.append(h) for h in sse_dict['310Helix']]
+    if '310Helix' in sse_dict:
+        helices.extend(sse_dict['310Helix'])
 
-    [sheets.append(s) for s in sse_dict['Strand']]
+    sheets = list(sse_dict['Strand'])
     
     # coil_weight can be used to add a "decay" of unstructured residues into the signal
     # in that case, a value like +0.1 is alright, this will sharpen helical regions
@@ -124,8 +129,13 @@ def find_boundaries(sse_dict, seq_len, bracket_size=50, domain_threshold=50, coi
     for element_tuple in sheets:
         scored_seq[element_tuple[0]:element_tuple[1]] = 1
 
-    # Smooth the SSE signal with np.convolve 
-    signal = np.convolve(scored_seq, np.ones([bracket_size]), mode='same')
+    # Smooth the SSE signal with a box filter, only its sign is evaluated.
+    # Without coil_weight, the signal is integer-valued and the O(N) running mean of uniform_filter1d has exactly the signs
+    # of the O(N*bracket_size) np.convolve sum. Fractional coil weights keep np.convolve, where rounding decides exact zeros.
+    if coil_weight == 0 and seq_len >= bracket_size:
+        signal = uniform_filter1d(scored_seq, size=bracket_size, mode='constant', output=np.float64)
+    else:
+        signal = np.convolve(scored_seq, np.ones([bracket_size]), mode='same')
     boundaries = detect_signchange(signal, exclude_zero=True)
 
     ### Find the interval with most negative values
@@ -134,23 +144,16 @@ def find_boundaries(sse_dict, seq_len, bracket_size=50, domain_threshold=50, coi
         print('No boundaries detected. Returning empty.')
         return None, None
     
-    helical_counts = np.zeros([len(boundaries)-1],dtype=int)
-
-    for k in range(len(boundaries)-1):
-        start, end = boundaries[k], boundaries[k+1]
-        sliced_array = scored_seq[start:end]
-        helical_counts[k] = np.count_nonzero(sliced_array == -1)
+    # Count the helical residues between each pair of consecutive boundaries from one cumulative sum
+    # The signal is longer than scored_seq if seq_len < bracket_size, boundaries past its end are clipped as in slicing
+    helical_cumsum = np.concatenate(([0], np.cumsum(scored_seq == -1)))
+    clipped_boundaries = np.minimum(boundaries, len(scored_seq))
+    helical_counts = helical_cumsum[clipped_boundaries[1:]] - helical_cumsum[clipped_boundaries[:-1]]
 
     # Find the "first" (from C-terminal) helical section larger than the threshold
-    # maxk is the size of the helical region
-    maxk = None
-    # reverse the helical array
-    rev_helical = helical_counts[::-1]
-
-    for rev_count, hel_len in enumerate(rev_helical):
-        if hel_len >= domain_threshold:
-            maxk = len(helical_counts)-(rev_count+1)
-            break
+    # maxk is the index of that helical region
+    large_helical = np.flatnonzero(helical_counts >= domain_threshold)
+    maxk = int(large_helical[-1]) if large_helical.size > 0 else None
 
     #print(f"[DEBUG] sse_func.find_boundaries : \n\tFound Helix boundary with the following characteristics: {maxk = } {helical_counts[maxk] = }(new variant)")
     # if it finds maxk, store the valies denoting the helical block for further refinement
@@ -161,11 +164,10 @@ def find_boundaries(sse_dict, seq_len, bracket_size=50, domain_threshold=50, coi
     gain_start, initial_boundary = boundaries[maxk], boundaries[maxk+1]
 
     if truncate_N is not None:
-        for i, res in enumerate(scored_seq[gain_start:]):
-            if res == -1:
-                print(f"[NOTE] Overwriting initial {gain_start = } with {gain_start+i-truncate_N}.")
-                gain_start = gain_start+i-truncate_N
-                break
+        first_helix = np.flatnonzero(scored_seq[gain_start:] == -1)
+        if first_helix.size > 0:
+            print(f"[NOTE] Overwriting initial {gain_start = } with {gain_start+first_helix[0]-truncate_N}.")
+            gain_start = gain_start+first_helix[0]-truncate_N
     # After it found the most likely helical block, adjust the edge of that, designate as Subdomain A
     # adjust the subdomain boundary to be in the middle of the loop between Helix and Sheet
 
@@ -208,21 +210,31 @@ def find_boundaries(sse_dict, seq_len, bracket_size=50, domain_threshold=50, coi
     #print(f"DEBUG: find_boundaries returning {boundaries[maxk] = }, {boundaries[maxk+1] = }")
     return gain_start, subdomain_boundary
 
-def sse_sequence2bools(sse_dict:dict):
+def sse_sequence2bools(sse_dict:dict, out_hel=None, out_she=None):
     '''
     Create a dictionary containing the actually detected alpha helices and beta sheets for all residues in sse_dict, 
     using lower_case mode detection and the spacing variable
+    Optionally, pre-allocated integer arrays out_hel and out_she (at least max(sse_dict) long) can be passed to be re-used
+    across many calls. The returned signals are then views into these buffers.
     '''
     #print(f"[DEBUG] sse_func.sse_sequence2bools:\n\t{sse_dict = }")
-    len = max(sse_dict.keys())
-    hel_signal = np.zeros(shape=[len], dtype=int)
-    she_signal = np.zeros(shape=[len], dtype=int)
-    
-    for res, assigned_sse in sse_dict.items():
-        if assigned_sse.upper() == "H" or assigned_sse.upper() == "G":
-            hel_signal[res] = 1
-        elif assigned_sse.upper() == "E":
-            she_signal[res] = 1
+    n_res = max(sse_dict.keys())
+    if out_hel is None:
+        hel_signal = np.zeros(shape=[n_res], dtype=int)
+    else:
+        hel_signal = out_hel[:n_res]
+        hel_signal.fill(0)
+    if out_she is None:
+        she_signal = np.zeros(shape=[n_res], dtype=int)
+    else:
+        she_signal = out_she[:n_res]
+        she_signal.fill(0)
+
+    # The one-letter SSE codes as ASCII bytes, &0xDF uppercases them (h -> H, e -> E) without a per-residue loop
+    residues = np.fromiter(sse_dict.keys(), dtype=int, count=len(sse_dict))
+    codes = np.frombuffer("".join(sse_dict.values()).encode(), dtype=np.uint8) & 0xDF
+    hel_signal[residues[(codes == ord("H")) | (codes == ord("G"))]] = 1
+    she_signal[residues[codes == ord("E")]] = 1
 
     return hel_signal, she_signal
 
@@ -253,52 +265,35 @@ def count_domain_sses(domain_start, domain_end, tuple_list=None, spacing=1, mini
     # Otherwise SSE_BOOL has been passed and is used directly
     # Truncate the SSE BOOL by setting everything outside the boundaries to zero.
     sse_bool[:domain_start] = 0
-    up_edges = []
-    down_edges = []
     #break_residues = []
 
-    for i in range(len(sse_bool)-1):
-        if sse_bool[i] and not sse_bool[i+1]: # [.. 1 0 ..]
-            down_edges.append(i+1)
-        if not sse_bool[i] and sse_bool[i+1]: # [.. 0 1 ..]
-            up_edges.append(i+1)
-    down_edges.append(len(sse_bool))
+    # Edges from the discrete derivative: +1 where [.. 0 1 ..], -1 where [.. 1 0 ..]
+    edges = np.diff((np.asarray(sse_bool) != 0).astype(np.int8))
+    up_edges = np.flatnonzero(edges == 1) + 1
+    down_edges = np.append(np.flatnonzero(edges == -1) + 1, len(sse_bool))
 
     if debug:
         print(f"[DEBUG] sse_func.count_domain_sses :\n\t{up_edges = }\n\t{down_edges = }")
     # Remove all segments between down-edge and up-edge where count(0) <= spacing
     # remove zero-segments whose length is smaller than $spacing
-    i = 0
+    # Fusing two elements removes the up-edge of the second and the down-edge of the first element, every gap is checked once.
+    n_elements = len(up_edges)
+    keep_gap = up_edges[1:] - down_edges[:n_elements-1] > spacing
+    if debug and not keep_gap.all():
+        print("[DEBUG] sse_func.count_domain_sses: Found breaks within specified spacing. Fusing elements at", up_edges[1:][~keep_gap])
+    up_edges = np.concatenate((up_edges[:1], up_edges[1:][keep_gap]))
+    down_edges = np.concatenate((down_edges[:n_elements-1][keep_gap], down_edges[n_elements-1:]))
     n_elements = len(up_edges)
-    while i < n_elements-1:
-        if debug: print(f"{i = } {n_elements = }\n\t{up_edges = }\n\t{down_edges = }")
-        unordered_length = up_edges[i+1] - down_edges[i]
-
-        if unordered_length <= spacing:  
-            if debug:
-                print("[DEBUG] sse_func.count_domain_sses: Found break within specified spacing. Fusing two elements", up_edges[i:i+2], down_edges[i:i+2])
-            del up_edges[i+1]
-            del down_edges[i]
-            n_elements -= 1
-            continue
-        # If this is a unique element, append empty breaks.
 
-        i += 1
-    
     # With the cleaned up lists of up_edges and down_edges, get all elements satisfying minium_length and within boundaries.
-    intervals = []
-    for i in range(n_elements):
-        element_length = down_edges[i] - up_edges[i]
-        if element_length < minimum_length:
-            continue
-        if up_edges[i] < domain_end:
-            intervals.append([up_edges[i], down_edges[i]-1])
+    element_mask = (down_edges[:n_elements] - up_edges >= minimum_length) & (up_edges < domain_end)
+    intervals = np.column_stack((up_edges[element_mask], down_edges[:n_elements][element_mask]-1)).tolist()
     if debug:
         print(f"[DEBUG] sse_func.count_domain_sses : RETURNING \n\t{intervals = }")#\n\t{break_residues = }")
 
     return np.asarray(intervals)#, break_residues
 
-def get_sse_type(sse_types, sse_dict):
+def get_sse_type(sse_types, sse_dict, debug=False):
     '''
     Get a list of all SSEs of a type (type/s as str / list) in sse_dict within
     a given Interval. Returns [] if the given types are not contained in sse_dict.keys()
@@ -308,29 +303,30 @@ def get_sse_type(sse_types, sse_dict):
             Specifies the key(s) in the dict to be looked up
         sse_dict : dict, required
             The dectionary to be parsed
+        debug : bool, optional
+            Print a note for every type not contained in sse_dict. default = False
 
     Returns:
         sse_tuples : list
             A list of tuples containing all residue indices with start and end
             of each SSE corresponding to the specified types
     '''
-    sse_tuples = []
-    
-    if type(sse_types) == list:
+    if isinstance(sse_types, str):
+        if sse_types not in sse_dict:
+            if debug: print(f"KeyError: no {sse_types} in dict.keys()")
+            return []
+        return sse_dict[sse_types]
+
+    if isinstance(sse_types, list):
+        sse_tuples = []
         for sse in sse_types:
-            if sse not in sse_dict.keys(): 
-                if sse != "310Helix":
+            if sse not in sse_dict:
+                if debug and sse != "310Helix":
                     print(f"KeyNotFound: {sse}") # Is is frequently the case that there are no 310Helices, nothing to worry there. print no Note.
                 continue
-            sse_tuples = sse_tuples + sse_dict[sse]
+            sse_tuples.extend(sse_dict[sse])
         return sse_tuples
-    
-    elif type(sse_types) == str:
-        if sse_types not in sse_dict.keys():
-            print(f"KeyError: no {sse_types} in dict.keys()")
-            return []
-        return sse_dict[sse_types]
-    
+
     print(f"Error: Key(s) not found {sse_types} (get_sse_type)")
     return []
 
@@ -352,19 +348,11 @@ def find_the_start(longseq, shortseq):
     '''
     cat_seq = "".join(shortseq)
     findstring = cat_seq[:15] # The First 15 residues of N-->C direction as matching string
-    id_array = np.arange(len(longseq)) # assign column indices to longseq, starting @ zero
-    map_matrix = np.ones([len(longseq)], dtype=bool)
+    longseq = "".join(longseq)
+    # The column indices of all non- "-" characters of longseq (UTF-32 gives one fixed-size code unit per character)
+    filter_id = np.flatnonzero(np.frombuffer(longseq.encode("utf-32-le"), dtype=np.uint32) != ord("-"))
 
-    for i, char in enumerate(longseq):
-        if char == "-":
-            map_matrix[i]=False 
-    
-    longseq_array = np.array([char for char in longseq]) #array of the FULL Seq
-    
-    filter_seq = longseq_array[map_matrix == True] # longseq without all "-" character
-    filter_id = id_array[map_matrix == True] #  The indices of non- "-" characters are preserved here
-    
-    locator = "".join(filter_seq).find(findstring) #print(f"DEBUG: {''.join(filter_seq) = } {locator = }")
+    locator = longseq.replace("-", "").find(findstring) #print(f"DEBUG: {longseq.replace('-', '') = } {locator = }")
     start = filter_id[locator] #print("Found the Start @", start)
     
     return start
@@ -395,8 +383,11 @@ def get_subdomain_sse(sse_dict:dict, subdomain_boundary:int, start:int, end:int,
         beta_breaks:
             array of breaking points in the SSE definiton. Used for disambiguating close SSE in Subdomain B
     '''
-    helices = get_sse_type(["AlphaHelix", "310Helix"], sse_dict)
-    sheets = get_sse_type("Strand", sse_dict)
+    # The SSE intervals are only parsed when they are used. With stride_outlier_mode, the SSE-sequence is evaluated instead.
+    helices, sheets = None, None
+    if not stride_outlier_mode or debug:
+        helices = get_sse_type(["AlphaHelix", "310Helix"], sse_dict)
+        sheets = get_sse_type("Strand", sse_dict)
     if debug:
         print(f"[DEBUG] sse_func.get_subdomain_sse : \n\t {helices = } \n\t {sheets = } \n\t {subdomain_boundary = }")
 
@@ -484,17 +475,20 @@ def get_pdb_extents(pdb, subdomain_boundary = None):
 
 def truncate_pdb(pdbfile:str, start:int, end:int):
     # truncates pdbfile at the start and end residue, including them.
-    pdblines = open(pdbfile).readlines()
     newlines = []
-    for line in pdblines:
-        if line.startswith("ATOM") and ( int(line[22:26]) < start or int(line[22:26]) > end ):
-            continue
-        if line.startswith("TER"):
-            prev_info = newlines[-1]
-            new_TER_line = f"TER   {str(int(prev_info[7:12])+1).rjust(5)}      {prev_info[17:26]}                                                      \n"
-            newlines.append(new_TER_line)
-            continue
-        newlines.append(line)
+    with open(pdbfile) as pdb:
+        for line in pdb:
+            if line.startswith("ATOM"):
+                # the residue number is parsed once per ATOM line
+                resid = int(line[22:26])
+                if resid < start or resid > end:
+                    continue
+            elif line.startswith("TER"):
+                prev_info = newlines[-1]
+                new_TER_line = f"TER   {str(int(prev_info[7:12])+1).rjust(5)}      {prev_info[17:26]}                                                      \n"
+                newlines.append(new_TER_line)
+                continue
+            newlines.append(line)
 
     open(f'{pdbfile.replace(".pdb","_trunc.pdb")}', 'w').write("".join(newlines))
     print(f"[NOTE] Truncated PDB to residues {start }-{end}.")
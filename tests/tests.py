@@ -9,7 +9,10 @@ from gaingrn.utils.gain_classes import GainCollection, GainDomainNoAln
 import gaingrn.utils.structure_utils
 import gaingrn.utils.template_utils
 import gaingrn.utils.assign
+from gaingrn.other.indexing import create_indexing
+import numpy as np
 import pandas as pd
+import shutil, tempfile
 from gaingrn.utils.variant_classes import *
 # Test functions have to start with "test_"
 
@@ -117,7 +120,64 @@ class TestFunctions(unittest.TestCase):
         valid_collection = pd.read_pickle("../data/valid_collection.pkl")
         centers, center_quality, aln_indices, pdb_centers= gaingrn.scripts.template_utils.get_template_information(identifier='A0A6G1Q0B9', gain_collection=valid_collection, subdomain='a')
         self.assertTrue(len(centers.keys()) == 6)
-    
+
+    def test_find_boundaries_short_sequence(self):
+        # Sequences shorter than bracket_size yield signchanges past the sequence end. These must not raise, but return (None, None)
+        sse_dict = {'AlphaHelix':[(1,11)], 'Strand':[(16,28)]}
+        for truncate_N in (None, 3):
+            start, subdomain_boundary = gaingrn.utils.structure_utils.find_boundaries(sse_dict, 26, bracket_size=50, domain_threshold=20, truncate_N=truncate_N)
+            self.assertTrue(start is None and subdomain_boundary is None)
+        # A helical block of sufficient size is still found
+        sse_dict = {'AlphaHelix':[(1,22)], 'Strand':[(26,40)]}
+        start, subdomain_boundary = gaingrn.utils.structure_utils.find_boundaries(sse_dict, 40, bracket_size=50, domain_threshold=20)
+        self.assertTrue(start == 0 and subdomain_boundary == 23)
+
+    def test_create_indexing_file_handle(self):
+        # Writing the indexing of all GAIN domains into one open file equals the concatenated per-domain files in outdir
+        alignment_file = "./test_data/gain_collection/test_seqs.mafft.fa"
+        aln_cutoff = 6567
+        alignment_dict = gaingrn.utils.io.read_alignment(alignment_file, aln_cutoff)
+        valid_seqs = gaingrn.utils.io.read_multi_seq("./test_data/gain_collection/offset_test_seqs.fa")
+        full_seqs = gaingrn.utils.io.read_alignment("./test_data/gain_collection/full_test_seqs.fa")
+        test_collection = GainCollection(alignment_file = alignment_file,
+                                    aln_cutoff = aln_cutoff,
+                                    quality = gaingrn.utils.io.read_quality("./test_data/gain_collection/offset_test_seqs.jal"),
+                                    gps_index = 6553,
+                                    stride_files = sorted(glob.glob("./test_data/gain_collection/stride/*.stride")),
+                                    sequence_files=None,
+                                    sequences=gaingrn.utils.alignment_utils.offset_sequences(full_seqs=full_seqs, short_seqs=valid_seqs),
+                                    alignment_dict = alignment_dict,
+                                    is_truncated = True,
+                                    coil_weight=0.00,
+                                    stride_outlier_mode=True,
+                                    debug=False)
+        anchors, anchor_occupation = test_collection.find_anchors(2)
+        anchor_dict = gaingrn.utils.alignment_utils.make_anchor_dict(anchors, test_collection.alignment_subdomain_boundary)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            outdir_contents = []
+            with open(f"{tmp_dir}/all_indexing.txt", "w") as file_handle:
+                for gain in test_collection.collection:
+                    outdir_result = create_indexing(gain, anchors, anchor_occupation, anchor_dict, outdir=tmp_dir, silent=True)
+                    handle_result = create_indexing(gain, anchors, anchor_occupation, anchor_dict, silent=True, file_handle=file_handle)
+                    self.assertTrue(str(handle_result) == str(outdir_result))
+                    with open(f"{tmp_dir}/{gain.name}.txt") as of:
+                        outdir_contents.append(of.read())
+            with open(f"{tmp_dir}/all_indexing.txt") as of:
+                self.assertTrue(of.read() == "".join(outdir_contents))
+
+    def test_sse_sequence2bools_buffers(self):
+        # Re-used output buffers yield the same signals as freshly allocated arrays, also when a shorter structure follows a longer one
+        stride_files = sorted(glob.glob("./test_data/gain_collection/stride/*.stride")) + ["../data/example/PKD1_1.stride"]
+        residue_sses = [gaingrn.utils.io.read_sse_asg(stride_file)[0] for stride_file in stride_files]
+        n_max = max(max(residue_sse.keys()) for residue_sse in residue_sses)
+        out_hel, out_she = np.ones([n_max], dtype=int), np.ones([n_max], dtype=int)
+        for residue_sse in sorted(residue_sses, key=len, reverse=True) + residue_sses:
+            hel_bool, she_bool = gaingrn.utils.structure_utils.sse_sequence2bools(residue_sse)
+            hel_buffered, she_buffered = gaingrn.utils.structure_utils.sse_sequence2bools(residue_sse, out_hel=out_hel, out_she=out_she)
+            self.assertTrue(np.array_equal(hel_buffered, hel_bool) and np.array_equal(she_buffered, she_bool))
+            self.assertTrue(np.shares_memory(hel_buffered, out_hel) and np.shares_memory(she_buffered, out_she))
+
 class TestClasses(unittest.TestCase):
     # Test Class instance generation and in that regard, also the underlying functions
 
@@ -189,5 +249,131 @@ class TestClasses(unittest.TestCase):
 
         self.assertTrue(len(GainMutations.generalized_mutations['H1.39']) == 3)
 
+class TestParsers(unittest.TestCase):
+    # Test the array-based parsers against the respective dict/list-based functions on the test data
+    stride_files = sorted(glob.glob("./test_data/gain_collection/stride/*.stride")) + ["../data/example/PKD1_1.stride"]
+
+    def test_SseTable(self):
+        for stride_file in self.stride_files:
+            sse_dict = gaingrn.utils.io.read_sse_loc(stride_file)
+            sse_table = gaingrn.utils.io.read_sse_table(stride_file)
+            self.assertTrue(len(sse_table) == sum(len(v) for v in sse_dict.values()))
+            self.assertTrue(sse_table.to_dict() == sse_dict)
+            for code, intervals in sse_dict.items():
+                self.assertTrue(sse_table.lookup(code).tolist() == [list(i) for i in intervals])
+            self.assertTrue(sse_table.lookup("NoSSE").shape == (0,2))
+
+    def test_SseTable_cut(self):
+        for stride_file in self.stride_files:
+            sse_dict = gaingrn.utils.io.read_sse_loc(stride_file)
+            sse_table = gaingrn.utils.io.read_sse_table(stride_file)
+            last = int(sse_table.lasts.max())
+            # Boundaries within SSEs, between SSEs and beyond the whole structure
+            for start, end in [(1, last), (50, 300), (101, 105), (int(sse_table.firsts[3])+1, int(sse_table.lasts[-3])-1), (last+10, last+20)]:
+                self.assertTrue(sse_table.cut(start, end).to_dict() == gaingrn.utils.structure_utils.cut_sse_dict(start, end, sse_dict))
+
+    def test_read_stride_angle_array(self):
+        for stride_file in self.stride_files:
+            residue_sse, _ = gaingrn.utils.io.read_sse_asg(stride_file)
+            for filter_letter in (None, "E", "H"):
+                angle_dict = gaingrn.utils.io.read_stride_angles(stride_file, filter_letter=filter_letter)
+                angles = gaingrn.utils.io.read_stride_angle_array(stride_file, filter_letter=filter_letter)
+                self.assertTrue(angles['pdb_idx'].tolist() == list(angle_dict.keys()))
+                self.assertTrue(np.column_stack((angles['phi'], angles['psi'])).tolist() == list(angle_dict.values()))
+                self.assertTrue(angles['sse'].tolist() == [residue_sse[i] for i in angle_dict.keys()])
+                if filter_letter is not None:
+                    self.assertTrue(set(angles['sse'].tolist()) <= {filter_letter})
+        # The ASG cache next to the STRIDE file yields the same array when written and when read back
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            stride_file = shutil.copy(self.stride_files[0], tmp_dir)
+            angles = gaingrn.utils.io.read_stride_angle_array(stride_file)
+            for _ in range(2):
+                cached = gaingrn.utils.io.read_stride_angle_array(stride_file, cache=True)
+                self.assertTrue(os.path.isfile(f"{stride_file}.ASG.npz"))
+                self.assertTrue(np.array_equal(cached, angles))
+
+    def test_read_stride_angle_array_mixed_width(self):
+        # ASG lines of different width, but with the same total length as uniform lines, are parsed line-wise as in read_stride_angles()
+        with open(self.stride_files[0]) as sf:
+            lines = sf.readlines()
+        asg_indices = [i for i, l in enumerate(lines) if l.startswith("ASG")]
+        # After the first line, pairs of one line padded by 10 characters and one cut by 10 characters (dropping the unparsed columns)
+        for i, j in zip(asg_indices[1::2], asg_indices[2::2]):
+            lines[i] = lines[i][:-1]+" "*10+"\n"
+            lines[j] = lines[j][:-11]+"\n"
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            stride_file = f"{tmp_dir}/mixed_width.stride"
+            with open(stride_file, "w") as sf:
+                sf.writelines(lines)
+            angle_dict = gaingrn.utils.io.read_stride_angles(stride_file)
+            angles = gaingrn.utils.io.read_stride_angle_array(stride_file)
+            self.assertTrue(angles['pdb_idx'].tolist() == list(angle_dict.keys()))
+            self.assertTrue(np.column_stack((angles['phi'], angles['psi'])).tolist() == list(angle_dict.values()))
+
+    def test_get_indices_replaced_alignment(self):
+        # An alignment replaced at the same path with the same size and mtime must not be read with the offsets of the old file
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            alignment_file = f"{tmp_dir}/aln.fa"
+            with open(alignment_file, "w") as fa:
+                fa.write(">a/1-4\n-ACDE-\n>b/1-4\nMKLV--\n")
+            mtime_ns = os.stat(alignment_file).st_mtime_ns
+            self.assertTrue(gaingrn.utils.alignment_utils.get_indices("a", np.array(list("ACDE")), alignment_file, -1).tolist() == [1,2,3,4])
+            with open(f"{tmp_dir}/new_aln.fa", "w") as fa:
+                fa.write(">b/1-4\nMKLV--\n>a/1-4\nACDE--\n")
+            os.replace(f"{tmp_dir}/new_aln.fa", alignment_file)
+            os.utime(alignment_file, ns=(mtime_ns, mtime_ns))
+            self.assertTrue(gaingrn.utils.alignment_utils.get_indices("a", np.array(list("ACDE")), alignment_file, -1).tolist() == [0,1,2,3])
+
+    def test_get_indices_batch(self):
+        # The parallel mapping equals get_indices() per sequence, with the alignment read by the workers or passed as alignment_dict
+        alignment_file = "./test_data/gain_collection/test_seqs.mafft.fa"
+        alignment_dict = gaingrn.utils.io.read_alignment(alignment_file, 6567)
+        full_seqs = gaingrn.utils.io.read_alignment("./test_data/gain_collection/full_test_seqs.fa")
+        adj_seqs = gaingrn.utils.alignment_utils.offset_sequences(full_seqs=full_seqs, short_seqs=gaingrn.utils.io.read_multi_seq("./test_data/gain_collection/offset_test_seqs.fa"))
+        names = [name for name, _ in adj_seqs]
+        sequences = [np.array(list(sequence)) for _, sequence in adj_seqs]
+        mappers = [gaingrn.utils.alignment_utils.get_indices(name, sequence, alignment_file, 6567, alignment_dict=alignment_dict) for name, sequence in zip(names, sequences)]
+        for batch_dict in (None, alignment_dict):
+            batch_mappers = gaingrn.utils.alignment_utils.get_indices_batch(names, sequences, alignment_file, 6567, alignment_dict=batch_dict, n_threads=2, chunksize=2)
+            self.assertTrue(len(batch_mappers) == len(mappers))
+            for batch_mapper, mapper in zip(batch_mappers, mappers):
+                self.assertTrue(np.array_equal(batch_mapper, mapper))
+
+    def test_find_stride_file_listing(self):
+        # New STRIDE files are found after the first listing, also with a wildcard in the directory part of the pattern
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.makedirs(f"{tmp_dir}/sigma_2")
+            for pattern in (f"{tmp_dir}/sigma_2/*.stride", f"{tmp_dir}/sigma_*/*.stride"):
+                self.assertTrue(gaingrn.utils.io.find_stride_file("PKD1", path=pattern) is None)
+            shutil.copy("../data/example/PKD1_1.stride", f"{tmp_dir}/sigma_2")
+            for pattern in (f"{tmp_dir}/sigma_2/*.stride", f"{tmp_dir}/sigma_*/*.stride"):
+                self.assertTrue(gaingrn.utils.io.find_stride_file("PKD1", path=pattern) == gaingrn.utils.io.read_sse_loc("../data/example/PKD1_1.stride"))
+
+    def test_FastaIndex(self):
+        alignment_file = "./test_data/gain_collection/test_seqs.mafft.fa"
+        for fasta_file in (alignment_file, "./test_data/gain_collection/full_test_seqs.fa", "./test_data/gain_collection/offset_test_seqs.fa"):
+            fasta_index = gaingrn.utils.io.FastaIndex(fasta_file)
+            for cutoff in (-1, 100, 6567):
+                sequences = gaingrn.utils.io.read_alignment(fasta_file, cutoff)
+                self.assertTrue(len(fasta_index) == len(sequences))
+                for name, sequence in sequences.items():
+                    self.assertTrue(name in fasta_index)
+                    self.assertTrue(fasta_index.fetch(name, cutoff) == sequence)
+            self.assertTrue(fasta_index.fetch("NotInTheFile") is None)
+
+        # The .fidx cache is written on first use and read back while the FASTA file is unchanged
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fasta_file = shutil.copy(alignment_file, tmp_dir)
+            fasta_index = gaingrn.utils.io.FastaIndex(fasta_file, cache=True)
+            self.assertTrue(os.path.isfile(f"{fasta_file}.fidx"))
+            cached_index = gaingrn.utils.io.FastaIndex(fasta_file, cache=True)
+            self.assertTrue(cached_index.offsets == fasta_index.offsets)
+            name = next(iter(fasta_index.offsets))
+            self.assertTrue(cached_index.fetch(name, 6567) == gaingrn.utils.io.read_alignment(fasta_file, 6567)[name])
+            # A modified FASTA file invalidates the cache
+            with open(fasta_file, "a") as fa:
+                fa.write("\n>appended/1-10\nACDEFGHIKL\n")
+            self.assertTrue(gaingrn.utils.io.FastaIndex(fasta_file, cache=True).fetch("appended") == "ACDEFGHIK")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file